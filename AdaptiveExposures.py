@@ -0,0 +1,105 @@
+import torch
+from .Exposure2HDR import saturated_fraction
+
+# exposure_0 plus up to 4 darker exposures
+MAX_EXPOSURES = 5
+
+class AdaptiveExposures:
+    """
+    DiffusionLight AdaptiveExposures class
+
+    Only requests a darker exposure when the brighter one has clipped highlights,
+    so the diffusion chain of a skipped exposure is never evaluated.
+    """
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "exposure_0": ("IMAGE",),
+                "gamma": ("FLOAT", {
+                    "default": 2.4,
+                    "min": -1000,
+                    "max": 1000,
+                    "step": 0.01,
+                    "round": False,
+                    "display": "number",
+                }),
+                "ev_values": ("STRING", {
+                    "multiline": False,
+                    "default": "0.0,-2.5,-5.0",
+                }),
+                "clipped_fraction": ("FLOAT", {
+                    "default": 0.001,
+                    "min": 0,
+                    "max": 1,
+                    "step": 0.0001,
+                    "round": False,
+                    "display": "number",
+                    "label": "Clipped Fraction",
+                }),
+            },
+            "optional": {
+                f"exposure_{i}": ("IMAGE", {"lazy": True}) for i in range(1, MAX_EXPOSURES)
+            },
+        }
+
+    RETURN_TYPES = ("IMAGE", "STRING")
+    RETURN_NAMES = ("exposures", "ev_values")
+
+    FUNCTION = "adaptive_exposures"
+
+    def check_lazy_status(self, exposure_0, gamma, ev_values, clipped_fraction, **exposures):
+        """
+        Called by ComfyUI until it returns an empty list, unevaluated lazy inputs are None.
+        Returns:
+            list: names of the exposures that still need to be evaluated.
+        """
+        num_exposures = len(parse_ev_values(ev_values))
+        name = next_exposure(exposure_0, exposures, num_exposures, gamma, clipped_fraction)
+        return [] if name is None else [name]
+
+    def adaptive_exposures(self, exposure_0, gamma, ev_values, clipped_fraction, **exposures):
+        """
+        Collect the evaluated exposures for Exposure2HDR
+        Args:
+            exposure_0 (IMAGE): The brightest (EV0) exposure, shape [1, H, W, 3].
+            gamma (float): The gamma value used to linearize the exposures.
+            ev_values (str): A comma-separated string of EV values of exposure_0, exposure_1, ...
+            clipped_fraction (float): Fraction of clipped pixels above which the next darker exposure is requested.
+        Returns:
+            tuple: the exposures batch [N, H, W, 3] and the ev_values string of the N exposures used.
+        """
+        evs = parse_ev_values(ev_values)
+        images = [exposure_0]
+        for i in range(1, len(evs)):
+            image = exposures.get(f"exposure_{i}")
+            if image is None:
+                break
+            images.append(image)
+        print(f"DiffusionLight: using {len(images)} of {len(evs)} exposures")
+        used_ev_values = ",".join(str(ev) for ev in evs[:len(images)])
+        return (torch.cat(images, dim=0), used_ev_values)
+
+
+# HELPER FUNCTION
+def parse_ev_values(ev_values):
+    return [float(ev.strip()) for ev in ev_values.split(",")][:MAX_EXPOSURES]
+
+def next_exposure(exposure_0, exposures, num_exposures, gamma, min_fraction):
+    """
+    Walk from the brightest exposure down, returns the name of the first darker exposure
+    that is needed but not evaluated yet, or None when nothing else is needed.
+    """
+    brighter = exposure_0
+    for i in range(1, num_exposures):
+        name = f"exposure_{i}"
+        # stop at unconnected inputs and once the brighter exposure has no clipped highlights
+        if name not in exposures or saturated_fraction(brighter, gamma) <= min_fraction:
+            return None
+        if exposures[name] is None:
+            return name
+        brighter = exposures[name]
+    return None
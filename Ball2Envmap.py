@@ -1,5 +1,7 @@
+import functools
 import numpy as np
 import torch
+from .postprocess_pool import run_postprocess
 
 class Ball2Envmap:
     """
@@ -17,25 +19,42 @@ class Ball2Envmap:
                 "envmap_height": ("INT", {"default": 256, "min": 1, "max": 8192, "step": 1, "label": "Image Size"}),
                 "anti_aliasing": (["1", "2", "4", "8", "16"], {"label": "MSAA Anti-Aliasing Scale", "default": "4"}),
             },
+            "optional": {
+                "progressive": ("BOOLEAN", {"default": False, "label": "Progressive Preview"}),
+                "preview_height": ("INT", {"default": 64, "min": 1, "max": 8192, "step": 1, "label": "First Preview Height"}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
 
     FUNCTION = "convert"
 
-    def convert(self, chromeball, anti_aliasing="4", envmap_height=256):
+    def convert(self, chromeball, anti_aliasing="4", envmap_height=256, progressive=False, preview_height=64):
         """
         Convert an environment map to a ball2envmap format.
 
         Args:
-            chromeball (IMAGE): The input environment map image. #Tensor of image format shape (range 0-1) shape [1, H, W, 3]
+            chromeball (IMAGE): The input environment map image. #Tensor of image format shape (range 0-1) shape [B, H, W, 3], a batch is converted frame by frame
+            progressive (bool): Show coarse MSAA-1 envmaps as the node preview while refining to the requested quality.
+            preview_height (int): Height of the first preview.
 
         Returns:
             tuple: A tuple containing the converted image.
         """
         # Assuming envmap is already in the correct format
         msaa_scale = int(anti_aliasing)
-        envmap = ball2envmap(chromeball, msaa_scale, envmap_height)
+        if not progressive:
+            envmap = run_postprocess(ball2envmap, chromeball, msaa_scale, envmap_height)
+            return (envmap, )
+
+        # inline, the previews are sent from this process
+        from comfy.utils import ProgressBar
+        num_levels = len(get_progressive_steps(envmap_height, msaa_scale, preview_height))
+        pbar = ProgressBar(num_levels)
+        for level, envmap in enumerate(ball2envmap_progressive(chromeball, msaa_scale, envmap_height, preview_height)):
+            if level < num_levels - 1:
+                pbar.update_absolute(level + 1, num_levels, ("JPEG", envmap_to_pil(envmap[0]), max(envmap.shape[1:3])))
+        pbar.update_absolute(num_levels, num_levels)
         return (envmap, )
     
 
@@ -52,10 +71,112 @@ def ball2envmap(chromeball, msaa_scale, envmap_height):
     """
     # Assuming the input is already in the correct format
 
-    I = np.array([1,0, 0]) # incoming vector, pointing to the camera
+    # using pytorch method for bilinear interpolation
+    with torch.no_grad():
+        # same lookup for every frame of the batch
+        grid = envmap_lookup_grid(envmap_height, msaa_scale, chromeball.device)
+        grid = grid.expand(chromeball.shape[0], -1, -1, -1)
+
+        # convert ball to support pytorch, a view: the memory stays channels_last
+        ball_image = chromeball.permute(0,3,1,2) # [B,3,H,W]
+        envmap = torch.nn.functional.grid_sample(ball_image, grid, mode='bilinear', padding_mode='border', align_corners=True)
+        envmap = resolve_msaa(envmap, msaa_scale, envmap_height)
+        envmap = envmap.permute(0,2,3,1) # [B,H,W,3] view, downstream nodes accept any strides
+
+    return envmap
+
+def ball2envmap_progressive(chromeball, msaa_scale, envmap_height, preview_height=64):
+    """
+    Level of detail version of ball2envmap, yields envmaps from coarse to final.
+
+    Every level samples the lookup grid at half the stride of the previous one and only
+    computes the samples the coarser levels did not, so the final envmap costs the same
+    grid_sample work as ball2envmap. Coarse levels are MSAA-1 envmaps (one sample per pixel),
+    the last one is the ball2envmap result. Coarse levels compute the lookup positions of
+    their own samples, only the last refinement uses the (cached) full lookup grid, so the
+    first preview does not wait for the full grid to be built.
+
+    Args:
+        chromeball (torch.Tensor): The input chromeball image tensor [B, H, W, 3].
+        preview_height (int): Minimum height of the first (coarsest) envmap.
+
+    Yields:
+        torch.Tensor: envmap [B, h, 2h, 3], views of the sample buffer stay valid as later levels only add samples.
+    """
+    with torch.no_grad():
+        ball_image = chromeball.permute(0,3,1,2) # [B,3,H,W]
+
+        def sample(rows, cols, step):
+            if step > 1:
+                grid = envmap_lookup_positions(envmap_height, msaa_scale, chromeball.device, rows, cols)
+            else:
+                grid = envmap_lookup_grid(envmap_height, msaa_scale, chromeball.device)[:, rows, cols]
+            grid = grid.expand(ball_image.shape[0], -1, -1, -1)
+            return torch.nn.functional.grid_sample(ball_image, grid, mode='bilinear', padding_mode='border', align_corners=True)
+
+        steps = get_progressive_steps(envmap_height, msaa_scale, preview_height)
+        num_rows = envmap_height * 2 if msaa_scale > 1 else envmap_height
+        samples = ball_image.new_empty((ball_image.shape[0], ball_image.shape[1], num_rows, num_rows * 2)) # [B,3,h,w]
+        samples[:, :, ::steps[0], ::steps[0]] = sample(slice(None, None, steps[0]), slice(None, None, steps[0]), steps[0])
+        for step in steps[1:]:
+            yield samples[:, :, ::step * 2, ::step * 2].permute(0,2,3,1)
+            # new rows, then the new columns of the old rows
+            samples[:, :, step::step * 2, ::step] = sample(slice(step, None, step * 2), slice(None, None, step), step)
+            samples[:, :, ::step * 2, step::step * 2] = sample(slice(None, None, step * 2), slice(step, None, step * 2), step)
+
+        yield resolve_msaa(samples, msaa_scale, envmap_height).permute(0,2,3,1)
+
+def get_progressive_steps(envmap_height, msaa_scale, preview_height):
+    """
+    Sampling strides of the lookup grid, coarse to fine (powers of two ending with 1).
+    The coarsest one is the largest that keeps at least preview_height rows.
+    """
+    num_rows = envmap_height * 2 if msaa_scale > 1 else envmap_height
+    step = 1
+    while num_rows // (step * 2) >= preview_height:
+        step *= 2
+    steps = []
+    while step >= 1:
+        steps.append(step)
+        step //= 2
+    return steps
+
+def resolve_msaa(samples, msaa_scale, envmap_height):
+    """
+    Reduce grid_sample output of the envmap_lookup_grid [B, 3, 2H, 4H] to the envmap [B, 3, H, 2H]
+    """
+    if msaa_scale == 1:
+        return samples
+    # bilinear downsample by msaa_scale (align_corners=False) is the mean of the 2x2 taps,
+    # same result as interpolate without its channels_last round trip copies on CPU
+    B, C = samples.shape[:2]
+    return samples.view(B, C, envmap_height, 2, envmap_height * 2, 2).mean(dim=(3, 5))
+
+def envmap_to_pil(envmap):
+    """
+    8-bit PIL image of an envmap [H, W, 3] in range 0-1, for previews
+    """
+    from PIL import Image
+    return Image.fromarray(np.clip(255. * envmap.cpu().numpy(), 0, 255).astype(np.uint8))
+
+# a grid is up to 64 MiB (1024 px at MSAA 4), keep only the ones in use
+@functools.lru_cache(maxsize=2)
+def envmap_lookup_grid(envmap_height, msaa_scale, device="cpu"):
+    """
+    Chromeball position to look up for every envmap sample, as a grid_sample grid in range [-1,1]
+    of shape [1, H, 2H, 2], or [1, 2H, 4H, 2] (2x2 taps per pixel) when msaa_scale > 1
+    Cached per resolution and device, frames of a sequence share it without copying it to the GPU again
+    """
+    return envmap_lookup_positions(envmap_height, msaa_scale, device)
+
+def envmap_lookup_positions(envmap_height, msaa_scale, device="cpu", rows=slice(None), cols=slice(None)):
+    """
+    Rows and columns (indices or slices) of the envmap_lookup_grid, computed for these samples only
+    """
+    I = np.array([1,0, 0], dtype=np.float32) # incoming vector, pointing to the camera, float32 like the grid
     
     # compute  normal map that create from reflect vector
-    env_grid = create_envmap_grid(envmap_height * msaa_scale)   
+    env_grid = create_envmap_grid(envmap_height * msaa_scale, msaa_scale, rows, cols)
     reflect_vec = get_cartesian_from_spherical(env_grid[...,1], env_grid[...,0])
     normal = get_normal_vector(I[None,None], reflect_vec)
 
@@ -64,31 +185,28 @@ def ball2envmap(chromeball, msaa_scale, envmap_height):
     pos  = 1.0 - pos
     pos = pos[...,1:]
 
-    env_map = None
-
-    # using pytorch method for bilinear interpolation
-    with torch.no_grad():
-        # convert position to pytorch grid look up
-        grid = torch.from_numpy(pos)[None].float()
-        grid = grid * 2 - 1 # convert to range [-1,1]
-
-        # convert ball to support pytorch
-        ball_image = chromeball.permute(0,3,1,2) # [1,3,H,W]
-        envmap = torch.nn.functional.grid_sample(ball_image, grid, mode='bilinear', padding_mode='border', align_corners=True)
-        envmap = torch.nn.functional.interpolate(envmap, size=(envmap_height, envmap_height * 2), mode='bilinear', align_corners=False) 
-        envmap = envmap.permute(0,2,3,1) # [1,H,W,3]
+    # convert position to pytorch grid look up
+    grid = torch.from_numpy(pos)[None].float()
+    grid = grid * 2 - 1 # convert to range [-1,1]
+    return grid.to(device)
 
-    return envmap
-
-def create_envmap_grid(size: int):
+def create_envmap_grid(size: int, msaa_scale: int = 1, rows=slice(None), cols=slice(None)):
     """
     BLENDER CONVENSION
     Create the grid of environment map that contain the position in sperical coordinate
     Top left is (0,0) and bottom right is (pi/2, 2pi)
+    With msaa_scale > 1 only keep the 2x2 samples per output pixel that a bilinear
+    downsample by msaa_scale reads: shape [2 * size / msaa_scale, 4 * size / msaa_scale, 2]
+    rows and cols (indices or slices) select a subset of that grid
     """    
     
     theta = torch.linspace(0, np.pi * 2, size * 2)
     phi = torch.linspace(0, np.pi, size)
+    if msaa_scale > 1:
+        theta = theta[get_msaa_taps(size * 2 // msaa_scale, msaa_scale)]
+        phi = phi[get_msaa_taps(size // msaa_scale, msaa_scale)]
+    theta = theta[cols]
+    phi = phi[rows]
     
     #use indexing 'xy' torch match vision's homework 3
     theta, phi = torch.meshgrid(theta, phi ,indexing='xy') 
@@ -99,6 +217,14 @@ def create_envmap_grid(size: int):
 
     return theta_phi
 
+def get_msaa_taps(size: int, msaa_scale: int):
+    """
+    Sample indices read by a bilinear downsample from size * msaa_scale to size (align_corners=False):
+    output i sits at (i + 0.5) * msaa_scale - 0.5, between msaa_scale * i + msaa_scale / 2 - 1 and the next one
+    """
+    first = torch.arange(size) * msaa_scale + msaa_scale // 2 - 1
+    return torch.stack([first, first + 1], dim=-1).reshape(-1)
+
 def get_cartesian_from_spherical(theta: np.array, phi: np.array, r = 1.0):
     """
     BLENDER CONVENSION
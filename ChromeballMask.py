@@ -1,3 +1,4 @@
+import functools
 import torch
 import torch.nn.functional as F
 
@@ -44,6 +45,7 @@ class ChromeballMask:
         padded_image = padded_image.repeat(1, 1, 1, 3)
         return (padded_image, )
 
+@functools.lru_cache(maxsize=8)
 def get_circle_mask(size=256):
     x = torch.linspace(-1, 1, size)
     y = torch.linspace(1, -1, size)
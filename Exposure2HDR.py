@@ -1,4 +1,3 @@
-import numpy as np
 import torch
 
 class Exposure2HDR:
@@ -35,6 +34,10 @@ class Exposure2HDR:
 
     FUNCTION = "exposure_to_hdr"
 
+    def check_lazy_status(self, exposures, gamma, ev_values):
+        # gamma and ev_values are always needed, nothing to skip
+        return [name for name, value in (("gamma", gamma), ("ev_values", ev_values)) if value is None]
+
     def exposure_to_hdr(self, exposures, gamma, ev_values):
         """
         convert multiple image to a single HDR image
@@ -46,20 +49,15 @@ class Exposure2HDR:
         # Assuming envmap is already in the correct format
 
         ev_values = [float(ev.strip()) for ev in ev_values.split(",")]
+        # the exposures are merged into one image, inline with all threads
         hdr_image = exposure_to_hdr(exposures, gamma, ev_values)[None]
         return (hdr_image, )
     
 
-def exposure_to_hdr(exposures, gamma, evs):
-    
-    
-    scaler = np.array([0.212671, 0.715160, 0.072169])
+LUMINANCE_SCALER = (0.212671, 0.715160, 0.072169)
 
+def exposure_to_hdr(exposures, gamma, evs):
     
-    # inital first image
-    image0 = exposures[0]
-    image0_linear = torch.pow(image0, gamma)
-
     # read luminace for every image 
     luminances = []
     for i in range(len(evs)):
@@ -67,12 +65,13 @@ def exposure_to_hdr(exposures, gamma, evs):
         
         # apply gama correction
         linear_img = torch.pow(image, gamma)
+        if i == 0:
+            # inital first image
+            image0_linear = linear_img
         
-        # convert the brighness
-        linear_img *= 1 / (2 ** evs[i])
-        
-        # compute luminace
-        lumi = linear_img @ scaler
+        # compute luminace, then convert the brighness (luminance is linear in the pixel values)
+        lumi = luminance(linear_img)
+        lumi *= 1 / (2 ** evs[i])
         luminances.append(lumi)
         
     # start from darkest image
@@ -88,3 +87,24 @@ def exposure_to_hdr(exposures, gamma, evs):
     hdr_rgb = image0_linear * (out_luminace / (luminances[0] + 1e-10))[:, :, None]
 
     return hdr_rgb
+
+def saturated_fraction(image, gamma, threshold=0.9):
+    """
+    Fraction of pixels whose linear luminance is above threshold (of the max value),
+    exposure_to_hdr only takes a darker exposure for those pixels.
+    Args:
+        image (torch.Tensor): An exposure of shape [..., H, W, 3] (range 0-1).
+        gamma (float): The gamma value used to linearize the image.
+    """
+    return (luminance(torch.pow(image, gamma)) > threshold).float().mean().item()
+
+def luminance(image):
+    """
+    Luminance of an image [..., 3], accumulated channel by channel so NHWC views
+    of channels-first memory (e.g. Ball2Envmap output) need no contiguous copy
+    """
+    red, green, blue = image.unbind(-1)
+    lumi = red * LUMINANCE_SCALER[0]
+    lumi.add_(green, alpha=LUMINANCE_SCALER[1])
+    lumi.add_(blue, alpha=LUMINANCE_SCALER[2])
+    return lumi
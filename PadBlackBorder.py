@@ -50,7 +50,7 @@ def torch_pad_image(images, desired_size=(1024, 1024)):
     assert images.dim() == 4 and images.size(-1) == 3, "Input must be [B, H, W, 3]"
     B, H, W, C = images.shape
 
-    # Convert to [B, 3, H, W]
+    # View as [B, 3, H, W], the memory stays channels_last so interpolate keeps it NHWC
     images = images.permute(0, 3, 1, 2)
 
     # Calculate new sizes
@@ -63,14 +63,13 @@ def torch_pad_image(images, desired_size=(1024, 1024)):
 
     resized = F.interpolate(images, size=(new_H, new_W), mode='bilinear', align_corners=False)
 
-    # Create black canvas
-    padded = torch.zeros((B, 3, desired_size[0], desired_size[1]), dtype=images.dtype, device=images.device)
+    # Create black canvas, directly as [B, H, W, 3]
+    padded = torch.zeros((B, desired_size[0], desired_size[1], C), dtype=images.dtype, device=images.device)
 
     # Calculate offsets for centering
     top = (desired_size[0] - new_H) // 2
     left = (desired_size[1] - new_W) // 2
 
-    padded[:, :, top:top+new_H, left:left+new_W] = resized
+    padded[:, top:top+new_H, left:left+new_W, :] = resized.permute(0, 2, 3, 1)
 
-    # Convert back to [B, H, W, 3]
-    return padded.permute(0, 2, 3, 1)
\ No newline at end of file
+    return padded
\ No newline at end of file
@@ -1,5 +1,6 @@
 import numpy as np
 import torch
+from .postprocess_pool import run_postprocess
 
 class PercentileToPixelValueTonemap:
     """
@@ -41,13 +42,23 @@ class PercentileToPixelValueTonemap:
                     "lazy": True
                 }),
             },
+            "optional": {
+                "temporal_smoothing": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0,
+                    "max": 0.999,
+                    "step": 0.001,
+                    "round": False,
+                    "display": "number",
+                }),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
 
     FUNCTION = "percentile_to_pixel_value_tonemap"
 
-    def percentile_to_pixel_value_tonemap(self, images, percentile, pixel_value, gamma):
+    def percentile_to_pixel_value_tonemap(self, images, percentile, pixel_value, gamma, temporal_smoothing=0.0):
         """
         map percentile of the HDR image to some value for tonemapping
         set gamma to 1.0 to disable gamma correction
@@ -56,18 +67,32 @@ class PercentileToPixelValueTonemap:
             percentile (float): The percentile value to use for tonemapping.
             pixel_value (float): The pixel value to map the percentile to.
             gamma (float): The gamma value to apply during the conversion.
+            temporal_smoothing (float): Treat the batch as a frame sequence and smooth the percentile over time, 0 to disable.
         """
-        # apply gamma correction
-        if gamma != 1.0:
-            images = torch.pow(images, 1.0 / gamma)
+        if temporal_smoothing > 0:
+            # every frame depends on the previous ones
+            hdr_image = percentile_to_pixel_value_tonemap(images, percentile, pixel_value, gamma, temporal_smoothing)
+        else:
+            hdr_image = run_postprocess(percentile_to_pixel_value_tonemap, images, percentile, pixel_value, gamma)
+        return (hdr_image, )
+
+def percentile_to_pixel_value_tonemap(images, percentile, pixel_value, gamma, temporal_smoothing=0.0):
+    # apply gamma correction
+    if gamma != 1.0:
+        images = torch.pow(images, 1.0 / gamma)
 
-        # calculate the percentile value in beach image in batch dimension
+    # calculate the percentile value in beach image in batch dimension
+    if temporal_smoothing > 0:
+        # frame sequence: track the percentile instead of a full quantile per frame
+        tracker = TemporalPercentile(percentile, temporal_smoothing)
+        percentile_value = torch.stack([tracker.update(frame) for frame in images])
+    else:
         percentile_value = batch_percentile(images, percentile)
 
-        # map the percentile value to the pixel value
-        hdr_image = images / percentile_value[:,None,None,None] * pixel_value
+    # map the percentile value to the pixel value
+    hdr_image = images / percentile_value[:,None,None,None] * pixel_value
 
-        return (hdr_image, )
+    return hdr_image
 
 def batch_percentile(input_tensor: torch.Tensor, percentile: float) -> torch.Tensor:
     """
@@ -76,10 +101,51 @@ def batch_percentile(input_tensor: torch.Tensor, percentile: float) -> torch.Ten
     returns: shape [b]
     """
     # Flatten [H, W, 3] -> [-1] per image
-    flattened = input_tensor.view(input_tensor.shape[0], -1)  # shape [b, H*W*3]
+    flattened = flatten_in_memory_order(input_tensor)  # shape [b, H*W*3]
 
     # Compute percentile along dimension 1 (per image)
     result = torch.quantile(flattened, percentile / 100.0, dim=1)
     return result
-    
 
+def flatten_in_memory_order(input_tensor: torch.Tensor) -> torch.Tensor:
+    """
+    input_tensor: shape [b, ...] with any dense memory layout (e.g. NHWC view of NCHW memory)
+    returns: shape [b, -1], a view when possible. The order of the values differs
+    from .reshape() for non-contiguous inputs, which does not matter for a percentile.
+    """
+    # permute the image dimensions by decreasing stride, the result is contiguous for dense layouts
+    order = sorted(range(1, input_tensor.dim()), key=lambda dim: -input_tensor.stride(dim))
+    return input_tensor.permute(0, *order).reshape(input_tensor.shape[0], -1)
+
+class TemporalPercentile:
+    """
+    Percentile of a frame sequence, estimated on a strided subsample of every frame
+    and smoothed over time with an exponential moving average
+    """
+    def __init__(self, percentile, smoothing=0.9, sample_size=65536):
+        """
+        percentile: scalar float between 0 and 100
+        smoothing: weight of the previous frames in [0, 1), 0 follows every frame
+        sample_size: number of values sampled per frame
+        """
+        self.percentile = percentile
+        self.smoothing = smoothing
+        self.sample_size = sample_size
+        self.value = None
+
+    def update(self, frame: torch.Tensor) -> torch.Tensor:
+        """
+        frame: shape [H, W, 3]
+        returns: the smoothed percentile value (scalar tensor)
+        """
+        flattened = flatten_in_memory_order(frame[None])[0]
+        stride = max(flattened.numel() // self.sample_size, 1)
+        # a multiple of 3 would only ever sample one channel
+        if stride % 3 == 0:
+            stride += 1
+        estimate = torch.quantile(flattened[::stride], self.percentile / 100.0)
+        if self.value is None:
+            self.value = estimate
+        else:
+            self.value = self.smoothing * self.value + (1 - self.smoothing) * estimate
+        return self.value
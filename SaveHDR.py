@@ -1,8 +1,15 @@
 import numpy as np
 import torch
-import cv2
-import imageio
-import folder_paths
+import logging
+import functools
+from concurrent.futures.process import BrokenProcessPool
+from .postprocess_pool import get_postprocess_pool, discard_postprocess_pool
+from .hdr_codec import write_rgbe, write_exr, EXR_COMPRESSION, EXR_PIXEL_TYPE
+
+logger = logging.getLogger(__name__)
+
+# .hdr writers: imageio (default, as before), the built-in RGBE encoder with or without RLE
+HDR_WRITERS = ["imageio", "builtin rle", "builtin flat"]
 
 class SaveHDR:
     """
@@ -20,24 +27,80 @@ class SaveHDR:
                 "filename_prefix": ("STRING", {"default": "DiffusionLight"}), 
                 "file_extension": (["hdr","npy", "exr"], {"default": "hdr"}),
             },
+            "optional": {
+                "hdr_writer": (HDR_WRITERS, {"default": "imageio"}),
+                "exr_pixel_type": (list(EXR_PIXEL_TYPE), {"default": "float"}),
+                "exr_compression": (list(EXR_COMPRESSION), {"default": "zip"}),
+                "sequence": ("BOOLEAN", {"default": False, "label": "Save batch as frame sequence"}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
 
     FUNCTION = "save_hdr"
 
-    def save_hdr(self, hdr_image, filename_prefix, file_extension):
+    def save_hdr(self, hdr_image, filename_prefix, file_extension, hdr_writer="imageio", exr_pixel_type="float", exr_compression="zip", sequence=False):
+        import folder_paths
+
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, folder_paths.get_output_directory())
-        filename = f"{filename_prefix}_{counter+1:04d}.{file_extension}"
-        full_path = f"{full_output_folder}/{filename}"
-        print(f"Saving HDR image to {full_path}")
-        out_image = hdr_image[0].cpu().numpy().astype(np.float32)
-        if file_extension == "npy":
-            np.save(full_path, out_image)
-        elif file_extension == "hdr":
-            imageio.imwrite(full_path, out_image)
+        if sequence:
+            # one indexed file per frame of the batch: DiffusionLight_0001_0000.hdr, DiffusionLight_0001_0001.hdr, ...
+            filenames = [f"{filename_prefix}_{counter+1:04d}_{index:04d}.{file_extension}" for index in range(hdr_image.shape[0])]
         else:
-            cv2.imwrite(full_path, out_image)  # save in HDR format
+            filenames = [f"{filename_prefix}_{counter+1:04d}.{file_extension}"]
+        pool = get_postprocess_pool()
+        for frame, filename in zip(hdr_image, filenames):
+            full_path = f"{full_output_folder}/{filename}"
+            print(f"Saving HDR image to {full_path}")
+            if pool is not None:
+                args = (full_path, frame.cpu(), file_extension, exr_pixel_type, exr_compression, hdr_writer)
+                try:
+                    # encode in the background, the sampler can move on to the next job
+                    future = pool.submit(write_hdr, *args)
+                except BrokenProcessPool:
+                    discard_postprocess_pool(pool)
+                    pool = None
+                else:
+                    future.add_done_callback(functools.partial(_write_done, pool, args))
+                    continue
+            write_hdr(full_path, frame, file_extension, exr_pixel_type, exr_compression, hdr_writer)
         return (hdr_image, )
+
+# HELPER FUNCTION
+def write_hdr(full_path, hdr_image, file_extension, exr_pixel_type="float", exr_compression="zip", hdr_writer="imageio"):
+    """
+    Encode a single HDR image tensor [H, W, 3] to disk
+    .exr and .hdr with the builtin writers are encoded straight from the tensor's host buffer
+    """
+    if hdr_writer not in HDR_WRITERS:
+        raise ValueError(f"Unknown hdr_writer {hdr_writer!r}, expected one of {HDR_WRITERS}")
+    if file_extension == "npy":
+        np.save(full_path, hdr_image.cpu().numpy().astype(np.float32, copy=False))
+    elif file_extension == "hdr" and hdr_writer == "imageio":
+        # imageio's compiled RLE is still faster than write_rgbe, see benchmarks/bench_hdr_codec.py
+        import imageio
+        # format given, file objects have no extension to pick the writer by
+        imageio.imwrite(full_path, hdr_image.cpu().numpy().astype(np.float32, copy=False), format="hdr")
+    elif file_extension == "hdr":
+        write_rgbe(full_path, hdr_image, rle=hdr_writer == "builtin rle")
+    else:
+        write_exr(full_path, hdr_image, pixel_type=exr_pixel_type, compression=exr_compression)
+    return full_path
+
+def _write_done(pool, args, future):
+    """
+    Log a failed background write, a write lost with a dead worker is done here instead
+    """
+    error = future.exception()
+    if isinstance(error, BrokenProcessPool):
+        discard_postprocess_pool(pool)
+        try:
+            write_hdr(*args)
+            return
+        except Exception as e:
+            error = e
+    if error is not None:
+        logger.error(f"Error saving HDR image: {error}")
+
     
 
@@ -1,3 +1,5 @@
+# Node modules only import numpy/torch at load time, ComfyUI reads INPUT_TYPES of every
+# class at startup. folder_paths is imported on first execution.
 from .Ball2Envmap import Ball2Envmap
 from .Exposure2HDR import Exposure2HDR
 from .SaveHDR import SaveHDR
@@ -5,6 +7,7 @@ from .ExposureBracket import ExposureBracket
 from .PadBlackBorder import PadBlackBorder
 from .ChromeballMask import ChromeballMask
 from .PercentileToPixelValueTonemap import PercentileToPixelValueTonemap
+from .AdaptiveExposures import AdaptiveExposures
 
 
 # A dictionary that contains all nodes you want to export with their names
@@ -17,6 +20,7 @@ NODE_CLASS_MAPPINGS = {
     "DiffusionLightPadBlackBorder": PadBlackBorder,
     "DiffusionLightChromeballMask": ChromeballMask,
     "DiffusionLightPercentileToPixelValueTonemap": PercentileToPixelValueTonemap,
+    "DiffusionLightAdaptiveExposures": AdaptiveExposures,
 }
 
 # A dictionary that contains the friendly/humanly readable titles for the nodes
@@ -28,6 +32,7 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "DiffusionLightPadBlackBorder": "PadBlackBorder",
     "DiffusionLightChromeballMask": "ChromeballMask",
     "DiffusionLightPercentileToPixelValueTonemap": "PercentileToPixelValueTonemap",
+    "DiffusionLightAdaptiveExposures": "AdaptiveExposures",
 }
 
 
@@ -0,0 +1,98 @@
+"""
+Encode time and output size of the built-in RGBE / EXR encoders against imageio, cv2
+and the OpenEXR library. A reference writer that is not available here is listed as such.
+
+    python benchmarks/bench_hdr_codec.py --widths 1024 2048 4096 8192
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+
+from common import import_node_module
+
+hdr_codec = import_node_module("hdr_codec")
+
+def synthetic_envmap(width):
+    """
+    Sky gradient, a ground plane with texture and a small sun far above 1.0, shape [W/2, W, 3]
+    """
+    height = width // 2
+    rng = np.random.default_rng(0)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    sky = np.array([0.4, 0.6, 1.0], dtype=np.float32) * (1.5 - y)
+    ground = np.array([0.3, 0.25, 0.2], dtype=np.float32) * (0.5 + 0.5 * rng.random((height, width, 1), dtype=np.float32))
+    envmap = np.where(y < 0.5, sky, ground).astype(np.float32)
+    envmap = np.broadcast_to(envmap, (height, width, 3)).copy()
+    sun = (slice(height // 5, height // 5 + max(height // 64, 1)), slice(width // 3, width // 3 + max(width // 64, 1)))
+    envmap[sun] = 5000.0
+    return torch.from_numpy(envmap)
+
+def measure(encode, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = encode()
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+def file_size(write, suffix):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "envmap" + suffix)
+        write(path)
+        return os.path.getsize(path)
+
+def encoders(envmap):
+    yield "rgbe builtin rle", lambda: len(hdr_codec.encode_rgbe(envmap))
+    yield "rgbe builtin flat", lambda: len(hdr_codec.encode_rgbe(envmap, rle=False))
+    try:
+        import imageio
+        # the default SaveHDR .hdr writer: float32 copy, then imageio
+        yield "rgbe imageio (SaveHDR)", lambda: file_size(lambda path: imageio.imwrite(path, envmap.cpu().numpy().astype(np.float32)), ".hdr")
+    except ImportError:
+        pass
+    for pixel_type in hdr_codec.EXR_PIXEL_TYPE:
+        for compression in hdr_codec.EXR_COMPRESSION:
+            yield f"exr builtin {pixel_type} {compression}", lambda pixel_type=pixel_type, compression=compression: len(hdr_codec.encode_exr(envmap, pixel_type, compression))
+    # the SaveHDR .exr path before the built-in encoder, float zip
+    os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+    try:
+        import cv2
+    except ImportError:
+        yield "exr cv2", "unavailable, cv2 is not installed"
+    else:
+        if cv2.haveImageWriter(".exr"):
+            yield "exr cv2", lambda: file_size(lambda path: cv2.imwrite(path, envmap.cpu().numpy().astype(np.float32)), ".exr")
+        else:
+            yield "exr cv2", f"unavailable, cv2 {cv2.__version__} is built without OpenEXR"
+    try:
+        import OpenEXR
+    except ImportError:
+        yield "exr OpenEXR", "unavailable, OpenEXR is not installed"
+    else:
+        for pixel_type, dtype in (("half", np.float16), ("float", np.float32)):
+            channels = {name: envmap[..., i].cpu().numpy().astype(dtype) for i, name in enumerate("RGB")}
+            header = {"compression": OpenEXR.ZIP_COMPRESSION, "type": OpenEXR.scanlineimage}
+            yield f"exr OpenEXR {pixel_type} zip", lambda channels=channels, header=header: file_size(lambda path: OpenEXR.File(header, channels).write(path), ".exr")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--widths", type=int, nargs="+", default=[1024, 2048, 4096, 8192])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for width in args.widths:
+        envmap = synthetic_envmap(width)
+        print(f"== {width}x{width // 2} ({envmap.numel() * 4 / 2 ** 20:.1f} MiB float32)")
+        for name, encode in encoders(envmap):
+            if isinstance(encode, str):
+                print(f"   {name:28s} {encode}")
+                continue
+            elapsed, size = measure(encode, args.repeat)
+            print(f"   {name:28s} {elapsed * 1000:9.1f} ms {size / 2 ** 20:9.2f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Import-time breakdown (python -X importtime) of the node pack and the RunPod handler
+
+Fails when a heavy dependency is loaded at import time instead of on first use:
+
+    python benchmarks/bench_import_time.py --top 15
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+from common import REPO_ROOT
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name: (already loaded by the host process, code to measure, must not be imported)
+TARGETS = {
+    # ComfyUI has torch loaded already, the pack itself must not pull in more
+    "node pack": ("import torch", "import common; common.import_node_pack()", ["cv2", "imageio", "folder_paths"]),
+    # the handler must be able to answer before the model libraries are loaded
+    "handler": ("pass", "import handler", ["torch", "diffusers", "runpod", "requests", "PIL", "numpy", "boto3", "botocore"]),
+}
+
+def importtime(code):
+    """
+    Returns:
+        list: (module, self_us, cumulative_us) for every import made by code
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_ROOT, BENCHMARK_DIR]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    for name, (host, code, forbidden) in TARGETS.items():
+        baseline = {module for module, _, _ in importtime(host)}
+        rows = [row for row in importtime(f"{host}; {code}") if row[0] not in baseline]
+        total_ms = sum(self_us for _, self_us, _ in rows) / 1000
+        print(f"== {name}: {total_ms:.1f} ms in {len(rows)} modules")
+        for module, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[:args.top]:
+            print(f"   {cumulative_us / 1000:8.1f} ms cumulative {self_us / 1000:8.1f} ms self  {module}")
+        loaded = sorted({module.split(".")[0] for module, _, _ in rows} & set(forbidden))
+        if loaded:
+            failed = True
+            print(f"   FAIL: imported at startup: {', '.join(loaded)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
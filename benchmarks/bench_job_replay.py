@@ -0,0 +1,390 @@
+"""
+Replay RunPod job events through handler.handler to capacity-plan workers
+
+Jobs come from a JSONL file with one event per line, {"id": ..., "input": {"image_url": ...}}.
+A bare input object also works, and "arrival" (seconds) is used by --arrival replay.
+Without --jobs the events are synthesized. Image URLs are rewritten to a local HTTP
+stand-in and the model is stubbed (--model-ms of simulated GPU time per image), so the
+replay runs offline:
+
+    python benchmarks/bench_job_replay.py --synthetic 200 --concurrency 4 --rate 8 --arrival poisson --model-ms 150
+    python benchmarks/bench_job_replay.py --jobs jobs.jsonl --arrival replay --report report.json
+"""
+import os
+import sys
+import json
+import time
+import types
+import zlib
+import random
+import logging
+import argparse
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+import handler
+
+# stage name: handler function timed as that stage
+STAGES = {
+    "download": "download_image",
+    "decode": "load_image",
+    "model": "image_to_hdri",
+    "encode": "save_hdri",
+    "upload": "upload_to_storage",
+}
+# report order, queue is arrival to start, first_preview and end_to_end are measured from arrival
+REPORT_STAGES = ["queue", "first_preview"] + list(STAGES) + ["total", "end_to_end"]
+PERCENTILES = (50, 95, 99)
+
+class StageTimer:
+    """Thread-safe durations per stage, pipeline threads of sequence jobs record too"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = collections.defaultdict(list)
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.durations[stage].append(seconds)
+
+    def wrap(self, fn, stage):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        rows = {}
+        for stage in REPORT_STAGES + sorted(set(self.durations) - set(REPORT_STAGES)):
+            durations = self.durations.get(stage)
+            if not durations:
+                continue
+            row = {"count": len(durations), "max_ms": max(durations) * 1000}
+            for percentile, value in zip(PERCENTILES, np.percentile(durations, PERCENTILES)):
+                row[f"p{percentile}_ms"] = value * 1000
+            rows[stage] = row
+        return rows
+
+class MemorySampler:
+    """Peak resident set size of this process while running"""
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.start_rss = current_rss()
+        self.peak_rss = self.start_rss or 0
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, current_rss() or 0)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        if self.start_rss is None:
+            # no /proc, fall back to the lifetime peak
+            import resource
+            self.peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+# LOCAL STAND-INS
+class ImageServer:
+    """
+    HTTP stand-in for the image hosts, serves --image-dir files by name
+    and a synthetic JPEG (cached, deterministic per path) for everything else
+    """
+    def __init__(self, image_size="1024x1024", image_dir=None, latency_ms=0.0):
+        self.width, self.height = map(int, image_size.split("x"))
+        self.image_dir = image_dir
+        self.latency_ms = latency_ms
+        self.lock = threading.Lock()
+        self.cache = {}
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000)
+                body = server.image(urlparse(self.path).path)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+        self.httpd.daemon_threads = True
+        self.netloc = "127.0.0.1:%d" % self.httpd.server_address[1]
+
+    def image(self, path):
+        if self.image_dir:
+            file_path = os.path.join(self.image_dir, os.path.basename(path))
+            if os.path.isfile(file_path):
+                with open(file_path, "rb") as f:
+                    return f.read()
+        with self.lock:
+            if path not in self.cache:
+                self.cache[path] = synthetic_jpeg(self.width, self.height, seed=zlib.crc32(path.encode()))
+            return self.cache[path]
+
+    def localize(self, url):
+        parsed = urlparse(url)
+        path = parsed.path if parsed.path.startswith("/") else "/" + parsed.path
+        return parsed._replace(scheme="http", netloc=self.netloc, path=path).geturl()
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def synthetic_jpeg(width, height, seed):
+    import io
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = rng.random(3, dtype=np.float32)
+    image = base * (x / width)[..., None] + (1 - base) * (y / height)[..., None]
+    image += rng.normal(0, 0.05, size=(height, width, 3)).astype(np.float32)
+    buffer = io.BytesIO()
+    Image.fromarray((image.clip(0, 1) * 255).astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def install_progress_update(callback):
+    """Route runpod.serverless.progress_update to callback, with a stand-in module when runpod is missing"""
+    try:
+        import runpod
+    except ImportError:
+        runpod = types.ModuleType("runpod")
+        runpod.serverless = types.SimpleNamespace()
+        sys.modules["runpod"] = runpod
+    runpod.serverless.progress_update = callback
+
+def stub_model(image_to_hdri, model_ms):
+    def run(image_array):
+        # the GPU is busy, the worker thread waits like on a CUDA sync
+        time.sleep(model_ms / 1000)
+        return image_to_hdri(image_array)
+    return run
+
+# JOBS
+def read_jobs(path):
+    """
+    Returns:
+        tuple: the job events, and the number of lines that are not jobs
+    """
+    events = []
+    skipped = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if "input" not in event:
+                if "image_url" not in event and "frame_urls" not in event:
+                    skipped += 1
+                    continue
+                event = {"input": event}
+            events.append(event)
+    return events, skipped
+
+def synthesize_jobs(count, resolution="1024x512", formats=("exr",), sequence_fraction=0.0, frames=8, preview_fraction=0.0, distinct_images=16, seed=0):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        job_input = {"resolution": resolution, "format": rng.choice(formats), "job_id": f"synthetic-{i}"}
+        if rng.random() < sequence_fraction:
+            job_input["frame_urls"] = [f"/images/{rng.randrange(distinct_images)}.jpg" for _ in range(frames)]
+        else:
+            job_input["image_url"] = f"/images/{rng.randrange(distinct_images)}.jpg"
+        if rng.random() < preview_fraction:
+            job_input["preview"] = True
+        events.append({"id": f"synthetic-{i}", "input": job_input})
+    return events
+
+def arrival_times(events, mode, rate, seed=0):
+    """
+    Arrival of every job in seconds from the start, rate <= 0 submits everything at once
+    """
+    if mode == "replay":
+        return [float(event.get("arrival", 0.0)) for event in events]
+    if rate <= 0:
+        return [0.0] * len(events)
+    if mode == "constant":
+        return [i / rate for i in range(len(events))]
+    rng = random.Random(seed)
+    arrivals = []
+    arrival = 0.0
+    for _ in events:
+        arrivals.append(arrival)
+        arrival += rng.expovariate(rate)
+    return arrivals
+
+def output_paths(output):
+    output = output.get("output") or {}
+    paths = output.get("result_urls") or [output.get("result_url")]
+    return [path for path in paths if path and os.path.isfile(path)]
+
+def remove_output(path):
+    os.unlink(path)
+    directory = os.path.dirname(path)
+    if os.path.basename(directory).startswith("hdri_"):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+def replay(events, arrivals, concurrency, timer, keep_outputs=False):
+    """
+    Submit events at their arrival time to concurrency handler threads
+    Returns:
+        tuple: the handler outputs in event order, and the elapsed seconds
+    """
+    arrived = {}
+
+    def on_progress(job, progress):
+        if isinstance(progress, dict) and progress.get("stage") == "preview":
+            timer.record("first_preview", time.perf_counter() - arrived[job["id"]])
+            if not keep_outputs and os.path.isfile(progress.get("preview_url", "")):
+                remove_output(progress["preview_url"])
+    install_progress_update(on_progress)
+
+    def run_job(event, arrival):
+        started = time.perf_counter()
+        timer.record("queue", started - arrival)
+        try:
+            output = handler.handler(event)
+        except Exception as e:
+            output = {"status": "failed", "error": repr(e)}
+        finished = time.perf_counter()
+        timer.record("total", finished - started)
+        timer.record("end_to_end", finished - arrival)
+        if not keep_outputs:
+            for path in output_paths(output):
+                remove_output(path)
+        return output
+
+    start = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job") as pool:
+        for i, (event, arrival) in enumerate(zip(events, arrivals)):
+            event.setdefault("id", f"replay-{i}")
+            arrival = start + arrival
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            arrived[event["id"]] = arrival
+            futures.append(pool.submit(run_job, event, arrival))
+        outputs = [future.result() for future in futures]
+    return outputs, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", help="JSONL file of job events, synthesized when omitted")
+    parser.add_argument("--synthetic", type=int, default=50, help="number of synthetic jobs")
+    parser.add_argument("--resolution", default="1024x512")
+    parser.add_argument("--formats", nargs="+", default=["exr"])
+    parser.add_argument("--sequence-fraction", type=float, default=0.0)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--preview-fraction", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--arrival", choices=["constant", "poisson", "replay"], default="constant")
+    parser.add_argument("--rate", type=float, default=0.0, help="jobs per second, 0 submits everything at once")
+    parser.add_argument("--model-ms", type=float, default=0.0, help="simulated model time per image")
+    parser.add_argument("--real-model", action="store_true", help="keep the handler's warm-up and model step")
+    parser.add_argument("--image-size", default="1024x1024")
+    parser.add_argument("--image-dir", help="serve these files by name instead of synthetic images")
+    parser.add_argument("--server-latency-ms", type=float, default=0.0)
+    parser.add_argument("--keep-outputs", action="store_true")
+    parser.add_argument("--report", help="also write the report as JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="keep the handler's INFO logs")
+    args = parser.parse_args()
+
+    if args.jobs:
+        events, skipped = read_jobs(args.jobs)
+        if skipped:
+            print(f"skipped {skipped} lines of {args.jobs} that are not job events")
+    else:
+        events = synthesize_jobs(args.synthetic, args.resolution, args.formats, args.sequence_fraction, args.frames, args.preview_fraction, seed=args.seed)
+    if not events:
+        sys.exit("no jobs to replay")
+    arrivals = arrival_times(events, args.arrival, args.rate, seed=args.seed)
+
+    if not args.verbose:
+        logging.getLogger(handler.__name__).setLevel(logging.WARNING)
+    if not args.real_model:
+        handler.warm_up = lambda: None
+        handler.image_to_hdri = stub_model(handler.image_to_hdri, args.model_ms)
+    timer = StageTimer()
+    for stage, name in STAGES.items():
+        setattr(handler, name, timer.wrap(getattr(handler, name), stage))
+
+    with ImageServer(args.image_size, args.image_dir, args.server_latency_ms) as server:
+        for event in events:
+            job_input = event.get("input", {})
+            if job_input.get("image_url"):
+                job_input["image_url"] = server.localize(job_input["image_url"])
+            if job_input.get("frame_urls"):
+                job_input["frame_urls"] = [server.localize(url) for url in job_input["frame_urls"]]
+        with MemorySampler() as memory:
+            outputs, elapsed = replay(events, arrivals, args.concurrency, timer, args.keep_outputs)
+
+    errors = collections.Counter(output.get("error", "unknown error") for output in outputs if output.get("status") != "completed")
+    num_failed = sum(errors.values())
+    num_images = sum(output.get("output", {}).get("num_frames", 1) for output in outputs if output.get("status") == "completed")
+    report = {
+        "jobs": len(outputs),
+        "elapsed_s": elapsed,
+        "jobs_per_s": len(outputs) / elapsed,
+        "images_per_s": num_images / elapsed,
+        "failed": num_failed,
+        "error_rate": num_failed / len(outputs),
+        "errors": dict(errors.most_common(5)),
+        "start_rss_mib": (memory.start_rss or 0) / 2 ** 20,
+        "peak_rss_mib": memory.peak_rss / 2 ** 20,
+        "stages": timer.summary(),
+    }
+
+    arrival = "replayed arrival" if args.arrival == "replay" else f"{args.arrival} arrival at {args.rate or 'max'} jobs/s"
+    print(f"{report['jobs']} jobs in {elapsed:.2f} s, concurrency {args.concurrency}, {arrival}")
+    print(f"throughput {report['jobs_per_s']:.2f} jobs/s ({report['images_per_s']:.2f} images/s), {num_failed} failed ({report['error_rate']:.1%})")
+    for error, count in errors.most_common(5):
+        print(f"   {count:5d} x {error}")
+    print(f"peak RSS {report['peak_rss_mib']:.1f} MiB (start {report['start_rss_mib']:.1f} MiB)")
+    print(f"{'stage':14s} {'count':>6s} " + " ".join(f"{'p%d ms' % percentile:>9s}" for percentile in PERCENTILES) + f" {'max ms':>9s}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:14s} {row['count']:6d} " + " ".join(f"{row['p%d_ms' % percentile]:9.1f}" for percentile in PERCENTILES) + f" {row['max_ms']:9.1f}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
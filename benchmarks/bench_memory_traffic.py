@@ -0,0 +1,119 @@
+"""
+Allocations and bytes copied per node for a full post-processing run of the workflow
+
+Fails when a node makes a layout copy (contiguous / clone / copying reshape),
+IMAGE tensors are NHWC and nodes must accept any strides, e.g. the NHWC view of
+channels-first memory that Ball2Envmap returns.
+
+The torch profiler only sees ATen allocations and copies. The SaveHDR rows encode
+with NumPy on the host, for them the peak of the NumPy (and Python) allocations is
+measured with tracemalloc instead, allocations made inside compiled writers such as
+imageio's are not seen:
+
+    python benchmarks/bench_memory_traffic.py --envmap-height 256
+"""
+import io
+import os
+import sys
+import argparse
+import tracemalloc
+
+import torch
+from torch.profiler import profile, ProfilerActivity
+
+from common import import_node_pack
+
+os.environ.pop("DIFFUSIONLIGHT_POSTPROCESS_WORKERS", None)  # profile in this process
+package = import_node_pack()
+NODES = {name.replace("DiffusionLight", ""): node() for name, node in package.NODE_CLASS_MAPPINGS.items()}
+write_hdr = sys.modules[f"{package.__name__}.SaveHDR"].write_hdr
+
+LAYOUT_COPIES = {"aten::contiguous", "aten::clone", "aten::reshape", "aten::flatten"}
+# ignore the tiny bookkeeping clones some ops make (e.g. quantile)
+MIN_LAYOUT_COPY_NUMEL = 1024
+ELEMENT_SIZE = {"float": 4, "double": 8, "c10::Half": 2, "c10::BFloat16": 2, "bool": 1, "unsigned char": 1, "long int": 8, "int": 4}
+
+def numel(shape):
+    count = 1
+    for size in shape:
+        count *= size
+    return count
+
+def traffic(fn, *args, **kwargs):
+    """
+    Returns:
+        tuple: result of fn, and dict of allocations, bytes allocated, copies, bytes copied, layout copies
+    """
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True, record_shapes=True) as prof:
+        result = fn(*args, **kwargs)
+    stats = dict(allocations=0, allocated=0, copies=0, copied=0, layout_copies=[])
+    for event in prof.events():
+        # self usage counts each buffer once, at the op that allocated it
+        if event.self_cpu_memory_usage > 0:
+            stats["allocations"] += 1
+            stats["allocated"] += event.self_cpu_memory_usage
+        elif event.name == "aten::copy_" and event.input_shapes and event.input_shapes[0]:
+            stats["copies"] += 1
+            stats["copied"] += numel(event.input_shapes[0]) * ELEMENT_SIZE.get(event.input_dtypes[0], 4)
+        # a layout copy allocates a full-size buffer, views do not
+        if event.name in LAYOUT_COPIES and event.cpu_memory_usage > 0 and numel(event.input_shapes[0]) >= MIN_LAYOUT_COPY_NUMEL:
+            stats["layout_copies"].append(f"{event.name}{event.input_shapes[0]}")
+    return result, stats
+
+def host_traffic(fn, *args, **kwargs):
+    """
+    Returns:
+        tuple: result of fn, and dict with the peak bytes of the NumPy allocations
+    """
+    tracemalloc.start()
+    try:
+        result = fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, dict(host_peak=peak)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-height", type=int, default=1015)
+    parser.add_argument("--input-width", type=int, default=1350)
+    parser.add_argument("--ball-size", type=int, default=256)
+    parser.add_argument("--envmap-height", type=int, default=256)
+    parser.add_argument("--anti-aliasing", default="4")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    image = torch.rand(1, args.input_height, args.input_width, 3)
+    # stand-ins for the VAEDecode + ImageCrop outputs of the three exposures
+    chromeballs = [torch.rand(1, args.ball_size, args.ball_size, 3) * scale for scale in (1.0, 0.5, 0.25)]
+
+    rows = []
+    def run(name, fn, *fn_args, host=False, **fn_kwargs):
+        result, stats = (host_traffic if host else traffic)(fn, *fn_args, **fn_kwargs)
+        rows.append((name, stats))
+        return result
+
+    run("PadBlackBorder", NODES["PadBlackBorder"].pad_black_border, image, 1024, 1024)
+    run("ChromeballMask", NODES["ChromeballMask"].chromeball_mask, 1024, 1024, args.ball_size)
+    envmaps = [run(f"Ball2Envmap (EV{i})", NODES["Ball2Envmap"].convert, ball, args.anti_aliasing, args.envmap_height)[0] for i, ball in enumerate(chromeballs)]
+    exposures = run("ImageBatch (ComfyUI)", torch.cat, envmaps, dim=0)
+    hdr_image = run("Exposure2HDR", NODES["Exposure2HDR"].exposure_to_hdr, exposures, 2.4, "0.0,-2.5,-5.0")[0]
+    run("SaveHDR (hdr, imageio)", write_hdr, io.BytesIO(), hdr_image[0], "hdr", host=True)
+    run("SaveHDR (hdr, builtin rle)", write_hdr, io.BytesIO(), hdr_image[0], "hdr", hdr_writer="builtin rle", host=True)
+    run("SaveHDR (exr)", write_hdr, io.BytesIO(), hdr_image[0], "exr", "half", "zip", host=True)
+    run("PercentileToPixelValueTonemap", NODES["PercentileToPixelValueTonemap"].percentile_to_pixel_value_tonemap, envmaps[0], 90.0, 0.9, 2.4)
+    run("ExposureBracket", NODES["ExposureBracket"].exposure_bracket, hdr_image, 2.4, "0.0,-1.0,-2.0,-3.0,-4.0,-5.0")
+
+    # ATen columns from the torch profiler, host peak from tracemalloc, n/a where a row is not measured that way
+    print(f"{'node':32s} {'allocs':>7s} {'MiB alloc':>10s} {'copies':>7s} {'MiB copied':>11s} {'host peak MiB':>14s}  layout copies")
+    failed = False
+    for name, stats in rows:
+        if "host_peak" in stats:
+            print(f"{name:32s} {'n/a':>7s} {'n/a':>10s} {'n/a':>7s} {'n/a':>11s} {stats['host_peak'] / 2 ** 20:14.2f}  n/a")
+            continue
+        print(f"{name:32s} {stats['allocations']:7d} {stats['allocated'] / 2 ** 20:10.2f} {stats['copies']:7d} {stats['copied'] / 2 ** 20:11.2f} {'n/a':>14s}  {', '.join(stats['layout_copies']) or '-'}")
+        failed |= bool(stats["layout_copies"])
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
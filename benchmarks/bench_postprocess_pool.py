@@ -0,0 +1,95 @@
+"""
+Node latency of Ball2Envmap and PercentileToPixelValueTonemap inline and with the
+post-processing pool, for a single frame and a batch of frames, on synthetic chromeballs
+
+Also counts the open file descriptors after the repeated calls, checks that the
+inputs are left unshared and that a call after a worker was killed runs inline. Fails
+when the pool output differs from inline, fds leak, an input is modified or a dead
+worker breaks the node:
+
+    python benchmarks/bench_postprocess_pool.py --batch 8 --envmap-height 256 --workers 2 4
+"""
+import os
+import sys
+import signal
+import time
+import argparse
+
+import torch
+
+from common import import_node_module
+
+postprocess_pool = import_node_module("postprocess_pool")
+Ball2Envmap = import_node_module("Ball2Envmap").Ball2Envmap
+PercentileToPixelValueTonemap = import_node_module("PercentileToPixelValueTonemap").PercentileToPixelValueTonemap
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+def time_node(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        output = fn()
+    return (time.perf_counter() - start) / repeat, output
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--ball-size", type=int, default=256)
+    parser.add_argument("--envmap-height", type=int, default=256)
+    parser.add_argument("--anti-aliasing", default="4")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({2, os.cpu_count()}))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fd-calls", type=int, default=50, help="node calls before the file descriptors are counted")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    ball2envmap = Ball2Envmap()
+    tonemap = PercentileToPixelValueTonemap()
+    cases = {}
+    for batch in sorted({1, args.batch}):
+        chromeball = torch.rand(batch, args.ball_size, args.ball_size, 3)
+        envmaps = torch.rand(batch, args.envmap_height, args.envmap_height * 2, 3) * 4
+        cases[f"Ball2Envmap   B={batch:<3d}"] = (chromeball, lambda x=chromeball: ball2envmap.convert(x, args.anti_aliasing, args.envmap_height)[0])
+        cases[f"Tonemap       B={batch:<3d}"] = (envmaps, lambda x=envmaps: tonemap.percentile_to_pixel_value_tonemap(x, 90.0, 0.9, 2.4)[0])
+
+    failed = False
+    print(f"torch threads={torch.get_num_threads()}, cores={os.cpu_count()}")
+    inline = {}
+    for name, (_, fn) in cases.items():
+        inline[name] = time_node(fn, args.repeat)
+        print(f"{name} inline      {inline[name][0] * 1000:9.1f} ms")
+
+    for num_workers in args.workers:
+        postprocess_pool._pool = postprocess_pool.PostprocessPool(num_workers)
+        for name, (node_input, fn) in cases.items():
+            elapsed, output = time_node(fn, args.repeat)
+            same = torch.allclose(output, inline[name][1], atol=1e-5)
+            failed |= not same or node_input.is_shared()
+            print(f"{name} workers={num_workers:<3d} {elapsed * 1000:9.1f} ms  x{inline[name][0] / elapsed:.2f} vs inline  {'ok' if same else 'MISMATCH'}{'  INPUT SHARED' if node_input.is_shared() else ''}")
+
+        # every call shares a copy of its input and gets the result back, nothing may stay open;
+        # the first round opens the pool's own pipes, and the executor's result thread holds
+        # on to the last results until the next ones arrive, but the count must not grow
+        name = f"Ball2Envmap   B={args.batch:<3d}"
+        counts = [open_fds()]
+        for _ in range(2):
+            for _ in range(args.fd_calls):
+                cases[name][1]()
+            counts.append(open_fds())
+        failed |= counts[2] > counts[1] + num_workers
+        print(f"2 x {args.fd_calls} Ball2Envmap calls with {num_workers} workers: " + " -> ".join(map(str, counts)) + " open fds")
+
+        # a dead worker breaks the pool, the call falls back to inline and drops the pool
+        pool = postprocess_pool._pool
+        os.kill(next(iter(pool.executor._processes.values())).pid, signal.SIGKILL)
+        output = cases[name][1]()
+        recovered = torch.allclose(output, inline[name][1], atol=1e-5) and postprocess_pool._pool is None
+        failed |= not recovered
+        print(f"Ball2Envmap call after a worker was killed: {'inline' if recovered else 'FAILED'}")
+        pool.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
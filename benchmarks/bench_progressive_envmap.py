@@ -0,0 +1,69 @@
+"""
+Time to the first preview and total time of the progressive Ball2Envmap against the one-shot render
+
+Cold runs clear the lookup grid cache first (the first call at a resolution), warm runs
+reuse the cached grid (the following frames and calls):
+
+    python benchmarks/bench_progressive_envmap.py --envmap-heights 256 512 1024 --anti-aliasing 1 4
+"""
+import time
+import argparse
+
+import torch
+
+from common import import_node_module
+
+Ball2Envmap = import_node_module("Ball2Envmap")
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def cold(fn):
+    def run():
+        Ball2Envmap.envmap_lookup_grid.cache_clear()
+        return fn()
+    return run
+
+def first_and_total(chromeball, msaa_scale, envmap_height, preview_height):
+    start = time.perf_counter()
+    levels = Ball2Envmap.ball2envmap_progressive(chromeball, msaa_scale, envmap_height, preview_height)
+    next(levels)
+    first = time.perf_counter() - start
+    for _ in levels:
+        pass
+    return first, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ball-size", type=int, default=1024)
+    parser.add_argument("--envmap-heights", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--anti-aliasing", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--preview-height", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    chromeball = torch.rand(1, args.ball_size, args.ball_size, 3)
+    print(f"{'':>10s} {'':>5s} {'':>7s} {'one-shot ms':>16s} {'first preview ms':>16s} {'progressive ms':>16s}")
+    print(f"{'envmap':>10s} {'msaa':>5s} {'levels':>7s}" + f" {'cold':>7s} {'warm':>8s}" * 3)
+    for envmap_height in args.envmap_heights:
+        for msaa_scale in args.anti_aliasing:
+            one_shot = lambda: Ball2Envmap.ball2envmap(chromeball, msaa_scale, envmap_height)
+            progressive = lambda: first_and_total(chromeball, msaa_scale, envmap_height, args.preview_height)
+            # timed after the cold runs, which leave the grid cached
+            one_shot_cold = best_of(cold(one_shot), args.repeat)
+            one_shot_warm = best_of(one_shot, args.repeat)
+            runs_cold = [cold(progressive)() for _ in range(args.repeat)]
+            runs_warm = [progressive() for _ in range(args.repeat)]
+            times = [one_shot_cold, one_shot_warm]
+            for index in range(2):
+                times += [min(run[index] for run in runs_cold), min(run[index] for run in runs_warm)]
+            num_levels = len(Ball2Envmap.get_progressive_steps(envmap_height, msaa_scale, args.preview_height))
+            print(f"{envmap_height * 2:>5d}x{envmap_height:<4d} {msaa_scale:5d} {num_levels:7d}" + "".join(f" {t * 1000:7.1f} {'':>0s}" if i % 2 == 0 else f"{t * 1000:8.1f}" for i, t in enumerate(times)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Denoiser evaluations saved by sampling the early steps of all exposures once,
+with a tiny deterministic stub UNet and text encoder on CPU
+
+Replays jobs with repeating prompts through exposure_sampler and reports per job the
+evaluations, the ones saved, how far every exposure moves from sampling it on its own
+(relative RMS difference) and the prompt cache hits. Fails when shared_steps=0 does not match per-exposure sampling:
+
+    python benchmarks/bench_shared_prefix.py --steps 30 --shared-steps 0 3 6 10 --jobs 4
+"""
+import sys
+import time
+import zlib
+import argparse
+
+import torch
+
+from common import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+import exposure_sampler
+
+# SDXL-like shapes, scaled down
+LATENT_CHANNELS = 4
+TOKENS = 77
+EMBED_DIM = 64
+
+class StubUNet(torch.nn.Module):
+    """Denoiser (x, sigma, cond) -> denoised x, a fixed random conv net conditioned on the pooled prompt"""
+    def __init__(self, seed=0):
+        super().__init__()
+        generator = torch.Generator().manual_seed(seed)
+        self.conv = torch.nn.Conv2d(LATENT_CHANNELS, LATENT_CHANNELS, 3, padding=1)
+        self.proj = torch.nn.Linear(EMBED_DIM, LATENT_CHANNELS)
+        with torch.no_grad():
+            for parameter in self.parameters():
+                parameter.copy_(torch.randn(parameter.shape, generator=generator) * 0.2)
+
+    def forward(self, x, sigma, cond):
+        scale = (1 / (1 + sigma ** 2).sqrt())[:, None, None, None]
+        eps = torch.tanh(self.conv(x * scale) + self.proj(cond.mean(dim=1))[:, :, None, None])
+        return x - sigma[:, None, None, None] * eps
+
+class StubTextEncoder:
+    """Prompt -> [1, TOKENS, EMBED_DIM], deterministic per prompt, counts the encodes"""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt):
+        self.calls += 1
+        generator = torch.Generator().manual_seed(zlib.crc32(prompt.encode()))
+        return torch.randn(1, TOKENS, EMBED_DIM, generator=generator)
+
+def karras_sigmas(steps, sigma_min=0.0292, sigma_max=14.6146, rho=7.0):
+    ramp = torch.linspace(0, 1, steps)
+    sigmas = (sigma_max ** (1 / rho) + ramp * (sigma_min ** (1 / rho) - sigma_max ** (1 / rho))) ** rho
+    return torch.cat([sigmas, sigmas.new_zeros(1)])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--shared-steps", type=int, nargs="+", default=[0, 3, 6, 10])
+    parser.add_argument("--ev-values", default="0.0,-2.5,-5.0")
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--latent-size", type=int, default=128, help="latent height and width (1024 px image / 8)")
+    parser.add_argument("--cfg", type=float, default=5.0)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    evs = [float(ev) for ev in args.ev_values.split(",")]
+    unet = StubUNet()
+    text_encoder = StubTextEncoder()
+    encode = exposure_sampler.cached_encoder(text_encoder)
+    sigmas = karras_sigmas(args.steps)
+    # jobs alternate between two prompts, like a client sending the default prompt most of the time
+    prompts = ["a perfect mirrored reflective chrome ball sphere", "a perfect mirrored reflective chrome ball sphere, studio"]
+    dark_prompt = "a perfect black dark mirrored reflective chrome ball sphere"
+
+    failed = False
+    print(f"{'job':>4s} {'shared':>7s} {'evals':>6s} {'baseline':>9s} {'saved':>6s} {'calls':>6s} {'ms':>8s}  relative RMS difference to per-exposure sampling")
+    for job in range(args.jobs):
+        prompt = prompts[job % len(prompts)]
+        conditionings = exposure_sampler.exposure_conditionings(encode, prompt, dark_prompt, evs)
+        uncond = encode("matte, diffuse, flat, dull")
+        latent = torch.randn(1, LATENT_CHANNELS, args.latent_size, args.latent_size)
+        noise = torch.randn(1, LATENT_CHANNELS, args.latent_size, args.latent_size)
+
+        # every exposure on its own, as the workflow's separate KSampler chains do
+        runs = [exposure_sampler.sample_exposures(unet, latent, noise, sigmas, [cond], uncond, args.cfg) for cond in conditionings]
+        independent = torch.cat([run[0] for run in runs])
+        independent_calls = sum(run[1]["calls"] for run in runs)
+        for shared_steps in args.shared_steps:
+            start = time.perf_counter()
+            latents, stats = exposure_sampler.sample_exposures(unet, latent, noise, sigmas, conditionings, uncond, args.cfg, shared_steps)
+            elapsed = time.perf_counter() - start
+            deviation = ((latents - independent).flatten(1).pow(2).mean(dim=1) / independent.flatten(1).pow(2).mean(dim=1)).sqrt()
+            if shared_steps == 0 and deviation.max() > 1e-5:
+                failed = True
+            print(f"{job:4d} {shared_steps:7d} {stats['evaluations']:6d} {stats['baseline_evaluations']:9d} {stats['saved_evaluations']:6d} {stats['calls']:6d} {elapsed * 1000:8.1f}  " + " ".join(f"EV{ev:g}: {value:.2%}" for ev, value in zip(evs, deviation.tolist())))
+
+    print(f"per-exposure sampling makes {independent_calls} denoiser calls per job, the batched exposures {args.steps}")
+    cache = encode.cache_info()
+    print(f"prompt cache: {cache.hits} hits, {cache.misses} misses, text encoder ran {text_encoder.calls} times for {args.jobs} jobs")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
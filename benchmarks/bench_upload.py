@@ -0,0 +1,137 @@
+"""
+Upload throughput of the S3 uploader against a local S3-compatible stand-in
+
+Runs a moto server in-process, or uses --endpoint-url (e.g. a MinIO container) and --bucket.
+Every object is read back and compared. The response to the first CreateMultipartUpload
+of every object is lost as well. Fails when an object differs, a part is sent more often
+than its injected failures explain or an orphaned multipart upload is left in the bucket:
+
+    python benchmarks/bench_upload.py --sizes-mb 64 200 --workers 1 4 8 --fail-rate 0.2
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+import collections
+
+from common import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+import storage
+
+def start_moto():
+    """
+    Returns:
+        tuple: the running server and its endpoint URL
+    """
+    from moto.server import ThreadedMotoServer
+
+    # moto accepts any credentials, boto3 only needs some
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(name, "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+def ensure_bucket(client, bucket):
+    from botocore.exceptions import ClientError
+
+    try:
+        client.head_bucket(Bucket=bucket)
+    except ClientError:
+        client.create_bucket(Bucket=bucket)
+
+class FlakyParts:
+    """
+    Fail the first attempt of a random fraction of UploadPart requests before
+    they are sent, and count the requests per part. The response of the first
+    CreateMultipartUpload of every key is lost after the upload was created.
+    """
+    def __init__(self, client, fail_rate, rng):
+        self.fail_rate = fail_rate
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.sent = collections.Counter()
+        self.failed = collections.Counter()
+        self.created = collections.Counter()
+        client.meta.events.register("before-parameter-build.s3.UploadPart", self.before_parameter_build)
+        client.meta.events.register("after-call.s3.CreateMultipartUpload", self.after_create)
+
+    def after_create(self, parsed, **kwargs):
+        from botocore.exceptions import ReadTimeoutError
+
+        key = parsed["Key"]
+        with self.lock:
+            self.created[key] += 1
+            lost = self.created[key] == 1
+        if lost:
+            raise ReadTimeoutError(endpoint_url="injected lost response")
+
+    def before_parameter_build(self, params, **kwargs):
+        from botocore.exceptions import EndpointConnectionError
+
+        part = (params["UploadId"], params["PartNumber"])
+        with self.lock:
+            self.sent[part] += 1
+            fail = self.sent[part] == 1 and self.rng.random() < self.fail_rate
+            if fail:
+                self.failed[part] += 1
+        if fail:
+            raise EndpointConnectionError(endpoint_url="injected failure")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoint-url", help="S3-compatible endpoint, an in-process moto server when omitted")
+    parser.add_argument("--bucket", default="diffusionlight-bench")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[64, 200])
+    parser.add_argument("--part-size-mb", type=float, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="fraction of parts whose first attempt fails")
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = args.endpoint_url
+    if endpoint_url is None:
+        server, endpoint_url = start_moto()
+
+    rng = random.Random(0)
+    failed = False
+    try:
+        for size_mb in args.sizes_mb:
+            data = os.urandom(int(size_mb * 2 ** 20))
+            digest = hashlib.sha256(data).hexdigest()
+            print(f"== {size_mb:.0f} MiB object, {args.part_size_mb:.0f} MiB parts, {args.fail_rate:.0%} of first part attempts fail")
+            for workers in args.workers:
+                uploader = storage.ObjectStorage(args.bucket, endpoint_url=endpoint_url, part_size=int(args.part_size_mb * 2 ** 20), max_workers=workers, retry_delay=0.01)
+                ensure_bucket(uploader.client, args.bucket)
+                flaky = FlakyParts(uploader.client, args.fail_rate, rng)
+                key = f"bench/{size_mb:.0f}mb_{workers}.bin"
+
+                start = time.perf_counter()
+                uploader.upload(data, key)
+                elapsed = time.perf_counter() - start
+                uploader.shutdown()
+
+                stored = uploader.client.get_object(Bucket=args.bucket, Key=key)["Body"].read()
+                intact = hashlib.sha256(stored).hexdigest() == digest
+                num_parts = len(flaky.sent)
+                # a failed part is sent once more, never the whole object
+                resent = sum(flaky.sent.values()) - num_parts
+                expected = sum(flaky.failed.values())
+                orphans = [upload["UploadId"] for upload in uploader.client.list_multipart_uploads(Bucket=args.bucket, Prefix=key).get("Uploads", [])]
+                failed |= not intact or resent != expected or bool(orphans)
+                print(f"   {workers:2d} workers {elapsed * 1000:9.1f} ms {size_mb / elapsed:8.1f} MiB/s  {num_parts} parts, {resent} re-sent ({expected} injected failures), {flaky.created[key]} creates, {len(orphans)} orphaned uploads  {'ok' if intact else 'CORRUPT'}")
+    finally:
+        if server is not None:
+            server.stop()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
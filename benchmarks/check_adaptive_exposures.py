@@ -0,0 +1,114 @@
+"""
+Check of AdaptiveExposures.check_lazy_status and adaptive_exposures, exits non-zero on any failure
+
+Lazy inputs are passed the way ComfyUI does: connected but not evaluated yet is None,
+unconnected is missing. Covers an unclipped EV0 requesting nothing, a clipped EV0
+requesting exposure_1, an evaluated but clipped exposure_1 requesting exposure_2,
+unconnected inputs stopping the walk, and that adaptive_exposures returns the ev_values
+of the exposures it used, which Exposure2HDR accepts:
+
+    python benchmarks/check_adaptive_exposures.py
+"""
+import sys
+
+import torch
+
+from common import import_node_module
+
+AdaptiveExposures = import_node_module("AdaptiveExposures").AdaptiveExposures
+Exposure2HDR = import_node_module("Exposure2HDR").Exposure2HDR
+
+GAMMA = 2.4
+EV_VALUES = "0.0,-2.5,-5.0"
+CLIPPED_FRACTION = 0.001
+
+def exposure(clipped):
+    """
+    A [1, H, W, 3] exposure, a quarter of its pixels clipped or none of them
+    """
+    image = torch.full((1, 16, 32, 3), 0.3)
+    if clipped:
+        image[:, :8, :16] = 1.0
+    return image
+
+def lazy_status(node, exposure_0, ev_values=EV_VALUES, **exposures):
+    return node.check_lazy_status(exposure_0, GAMMA, ev_values, CLIPPED_FRACTION, **exposures)
+
+def evaluate(node, exposure_0, connected, ev_values=EV_VALUES):
+    """
+    Run the node like ComfyUI: evaluate what check_lazy_status asks for until it asks for nothing.
+    Args:
+        connected (dict): exposure name -> image produced when that input is evaluated.
+    Returns:
+        tuple: names evaluated in order, and the node outputs.
+    """
+    exposures = {name: None for name in connected}
+    evaluated = []
+    while True:
+        names = lazy_status(node, exposure_0, ev_values, **exposures)
+        if not names or len(evaluated) > len(connected):
+            break
+        for name in names:
+            exposures[name] = connected[name]
+            evaluated.append(name)
+    return evaluated, node.adaptive_exposures(exposure_0, GAMMA, ev_values, CLIPPED_FRACTION, **exposures)
+
+def check_unclipped_ev0():
+    node = AdaptiveExposures()
+    return lazy_status(node, exposure(False), exposure_1=None, exposure_2=None) == []
+
+def check_clipped_ev0():
+    node = AdaptiveExposures()
+    return lazy_status(node, exposure(True), exposure_1=None, exposure_2=None) == ["exposure_1"]
+
+def check_clipped_exposure_1():
+    node = AdaptiveExposures()
+    return lazy_status(node, exposure(True), exposure_1=exposure(True), exposure_2=None) == ["exposure_2"]
+
+def check_unconnected():
+    node = AdaptiveExposures()
+    # nothing connected after EV0, or after exposure_1
+    ok = lazy_status(node, exposure(True)) == []
+    ok &= lazy_status(node, exposure(True), exposure_1=exposure(True)) == []
+    # exposure_3 is connected but past the last ev_value
+    ok &= lazy_status(node, exposure(True), exposure_1=exposure(True), exposure_2=exposure(True), exposure_3=None) == []
+    return ok
+
+def check_truncated_ev_values():
+    node = AdaptiveExposures()
+    exposure_0 = exposure(True)
+    connected = {"exposure_1": exposure(False) * 0.5, "exposure_2": exposure(False) * 0.25}
+    evaluated, (exposures, ev_values) = evaluate(node, exposure_0, connected)
+    if evaluated != ["exposure_1"] or exposures.shape[0] != 2 or ev_values != "0.0,-2.5":
+        return False
+    # Exposure2HDR takes the node outputs as they are and merges the same images
+    hdr_image = Exposure2HDR().exposure_to_hdr(exposures, GAMMA, ev_values)[0]
+    expected = Exposure2HDR().exposure_to_hdr(torch.cat([exposure_0, connected["exposure_1"]]), GAMMA, "0.0,-2.5")[0]
+    return hdr_image.shape == (1, 16, 32, 3) and torch.equal(hdr_image, expected)
+
+def check_all_exposures():
+    node = AdaptiveExposures()
+    connected = {"exposure_1": exposure(True), "exposure_2": exposure(True), "exposure_3": exposure(True)}
+    evaluated, (exposures, ev_values) = evaluate(node, exposure(True), connected)
+    hdr_image = Exposure2HDR().exposure_to_hdr(exposures, GAMMA, ev_values)[0]
+    return evaluated == ["exposure_1", "exposure_2"] and ev_values == "0.0,-2.5,-5.0" and hdr_image.shape == (1, 16, 32, 3)
+
+def main():
+    checks = [
+        ("unclipped EV0 requests nothing", check_unclipped_ev0),
+        ("clipped EV0 requests exposure_1", check_clipped_ev0),
+        ("clipped exposure_1 requests exposure_2", check_clipped_exposure_1),
+        ("unconnected inputs stop the walk", check_unconnected),
+        ("truncated ev_values match the exposures, Exposure2HDR accepts them", check_truncated_ev_values),
+        ("every ev_value used when all exposures clip", check_all_exposures),
+    ]
+    failures = 0
+    for name, check in checks:
+        ok = check()
+        failures += not ok
+        print(f"{'ok' if ok else 'FAIL':4s}  {name}")
+    print(f"{failures} failed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
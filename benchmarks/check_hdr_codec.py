@@ -0,0 +1,204 @@
+"""
+Round-trip check of the built-in RGBE and EXR encoders, exits non-zero on any mismatch
+
+RGBE: the RLE output is decoded by a straightforward reference decoder (and by cv2
+when installed) at widths around the 128 byte packet limit, for constant, random and
+run-heavy scanlines. EXR: every pixel type and compression is read back with the OpenEXR
+library, or cv2 when it can read EXR, and must match exactly:
+
+    python benchmarks/check_hdr_codec.py
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from common import import_node_module
+
+hdr_codec = import_node_module("hdr_codec")
+
+WIDTHS = [8, 127, 128, 129, 255]
+HEIGHT = 5
+
+def decode_rgbe(data):
+    """
+    Reference decoder of new-style RLE and flat .hdr files, one packet at a time
+    Returns:
+        np.ndarray: RGBE bytes of shape [H, W, 4].
+    """
+    header, _, pixels = data.partition(b"\n\n")
+    if not header.startswith(b"#?RADIANCE") or b"FORMAT=32-bit_rle_rgbe" not in header:
+        raise ValueError(f"bad header {header!r}")
+    resolution, _, pixels = pixels.partition(b"\n")
+    _, height, _, width = resolution.split()
+    height, width = int(height), int(width)
+    if len(pixels) == height * width * 4 and pixels[:2] != b"\x02\x02":
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+
+    rgbe = np.empty((height, 4, width), dtype=np.uint8)
+    pos = 0
+    for y in range(height):
+        if pixels[pos:pos + 4] != bytes([2, 2, width >> 8, width & 0xFF]):
+            raise ValueError(f"scanline {y}: bad marker {pixels[pos:pos + 4]!r}")
+        pos += 4
+        for component in range(4):
+            x = 0
+            while x < width:
+                count = pixels[pos]
+                pos += 1
+                if count > 128:
+                    count -= 128
+                    values = pixels[pos:pos + 1] * count
+                    pos += 1
+                else:
+                    if count == 0:
+                        raise ValueError(f"scanline {y}: empty literal packet")
+                    values = pixels[pos:pos + count]
+                    pos += count
+                if x + count > width or len(values) != count:
+                    raise ValueError(f"scanline {y}: packet overruns the scanline")
+                rgbe[y, component, x:x + count] = np.frombuffer(values, dtype=np.uint8)
+                x += count
+    if pos != len(pixels):
+        raise ValueError(f"{len(pixels) - pos} trailing bytes")
+    return rgbe.transpose(0, 2, 1)
+
+def rgbe_scanlines(kind, width, rng):
+    """
+    RGBE planes [H, 4, W] of one kind: constant, random or run-heavy (runs of 1 to 300 bytes)
+    """
+    if kind == "constant":
+        return np.full((HEIGHT, 4, width), 77, dtype=np.uint8)
+    if kind == "random":
+        return rng.integers(0, 256, (HEIGHT, 4, width), dtype=np.uint8)
+    flat = np.empty(HEIGHT * 4 * width, dtype=np.uint8)
+    pos = 0
+    while pos < flat.size:
+        # short runs (literals), runs right at the minimum, and runs past one packet
+        length = int(rng.choice([1, 2, 3, 4, 5, 127, 128, 129, 300]))
+        flat[pos:pos + length] = rng.integers(0, 4)
+        pos += length
+    return flat.reshape(HEIGHT, 4, width)
+
+def rgbe_pixels(rgbe):
+    """
+    Float pixels [H, W, 3] with the runs of the RGBE planes [H, 4, W], exponents kept
+    in the range of real envmaps so that no pixel underflows to 0 on the way back
+    """
+    rgbe = rgbe.transpose(0, 2, 1).copy()
+    exponent = rgbe[..., 3]
+    exponent[:] = np.where(exponent == 0, 0, 100 + exponent % 61)
+    return rgbe_to_float(rgbe).astype(np.float32)
+
+def rgbe_to_float(rgbe):
+    exponent = rgbe[..., 3].astype(np.int32)
+    scale = np.where(exponent > 0, np.ldexp(1.0, exponent - 136), 0.0)
+    return (rgbe[..., :3] + 0.5) * scale[..., None]
+
+def check_rgbe(rng, failures):
+    for width in WIDTHS:
+        for kind in ("constant", "random", "run-heavy"):
+            # the RLE on its own
+            rgbe = rgbe_scanlines(kind, width, rng)
+            header = f"#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n-Y {HEIGHT} +X {width}\n".encode("ascii")
+            try:
+                decoded = decode_rgbe(header + hdr_codec.rle_scanlines(rgbe).tobytes())
+                ok = np.array_equal(decoded, rgbe.transpose(0, 2, 1))
+            except ValueError as e:
+                ok, kind = False, f"{kind} ({e})"
+            report(failures, f"rle   width {width:3d} {kind}", ok)
+
+            # the whole encoder on float pixels made of these bytes, RLE and flat
+            pixels = rgbe_pixels(rgbe)
+            expected = hdr_codec.float_to_rgbe(pixels).transpose(0, 2, 1)
+            for rle in (True, False):
+                data = hdr_codec.encode_rgbe(pixels, rle=rle)
+                try:
+                    decoded = decode_rgbe(data)
+                    ok = np.array_equal(decoded, expected)
+                    # every value comes back within the 8 bit mantissa
+                    ok &= bool(np.all(np.abs(rgbe_to_float(decoded) - pixels) <= np.ldexp(1.0, decoded[..., 3:].astype(np.int32) - 136)))
+                    ok &= check_cv2(data, pixels)
+                except ValueError as e:
+                    ok = False
+                    print(f"      {e}")
+                report(failures, f"rgbe  width {width:3d} {kind} {'rle' if rle else 'flat'}", ok)
+
+def check_cv2(data, pixels):
+    """
+    Decode with cv2 (Radiance support is built in) when installed
+    """
+    try:
+        import cv2
+    except ImportError:
+        return True
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "image.hdr")
+        with open(path, "wb") as f:
+            f.write(data)
+        decoded = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if decoded is None or decoded.shape != pixels.shape:
+        return False
+    # the shared exponent keeps 8 bits relative to the brightest channel
+    tolerance = pixels.max(axis=-1, keepdims=True) / 128
+    return bool(np.all(np.abs(decoded[..., ::-1] - pixels) <= tolerance))
+
+def exr_reader():
+    """
+    Returns:
+        tuple: name and a function path -> [H, W, 3] RGB pixels, or None when nothing can read EXR
+    """
+    try:
+        import OpenEXR
+    except ImportError:
+        pass
+    else:
+        def read(path):
+            channels = OpenEXR.File(path, separate_channels=True).channels()
+            return np.stack([channels[name].pixels for name in "RGB"], axis=-1)
+        return "OpenEXR", read
+    os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+    try:
+        import cv2
+    except ImportError:
+        return None
+    if not cv2.haveImageReader(".exr"):
+        return None
+    return "cv2", lambda path: cv2.imread(path, cv2.IMREAD_UNCHANGED)[..., ::-1]
+
+def check_exr(rng, failures):
+    reader = exr_reader()
+    if reader is None:
+        report(failures, "exr   no EXR reader (OpenEXR or cv2 with OpenEXR) installed", False)
+        return
+    name, read = reader
+    # heights off the 16 scanline zip chunks, noisy and flat regions
+    for height, width in ((1, 1), (37, 129), (64, 256)):
+        image = rng.random((height, width, 3), dtype=np.float32) * np.float32(1000)
+        image[height // 2:] = 0.25
+        for pixel_type, (_, dtype) in hdr_codec.EXR_PIXEL_TYPE.items():
+            for compression in hdr_codec.EXR_COMPRESSION:
+                with tempfile.TemporaryDirectory() as directory:
+                    path = os.path.join(directory, "image.exr")
+                    hdr_codec.write_exr(path, image, pixel_type=pixel_type, compression=compression)
+                    decoded = read(path)
+                expected = image.astype(dtype)
+                ok = decoded.dtype == expected.dtype and np.array_equal(decoded, expected)
+                report(failures, f"exr   {width}x{height} {pixel_type} {compression} read with {name}", ok)
+
+def report(failures, name, ok):
+    print(f"{'ok' if ok else 'FAIL':4s}  {name}")
+    if not ok:
+        failures.append(name)
+
+def main():
+    rng = np.random.default_rng(0)
+    failures = []
+    check_rgbe(rng, failures)
+    check_exr(rng, failures)
+    print(f"{len(failures)} failed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
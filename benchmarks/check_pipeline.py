@@ -0,0 +1,168 @@
+"""
+Check of handler.run_pipeline and process_hdri_sequence, exits non-zero on any failure
+
+Covers results in order with stages of uneven speed, an error in a middle stage, the
+consumer stopping early (generator close), that no pipeline thread outlives a run and
+that no downloaded frame is left in the temporary directory after an error or an early stop:
+
+    python benchmarks/check_pipeline.py
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+
+import numpy as np
+
+from common import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+import handler
+
+NUM_ITEMS = 40
+
+class Tracker:
+    """Input items taken from the iterable, started by the first stage and dropped"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.taken = set()
+        self.started = set()
+        self.dropped = set()
+
+    def items(self, count):
+        for item in range(count):
+            with self.lock:
+                self.taken.add(item)
+            yield item
+
+    def first_stage(self, item):
+        with self.lock:
+            self.started.add(item)
+        return item
+
+    def on_drop(self, item):
+        with self.lock:
+            self.dropped.add(item)
+
+    def accounted(self):
+        # every item taken is processed or dropped, exactly once
+        return self.taken == self.started | self.dropped and not self.started & self.dropped
+
+def jitter(item):
+    time.sleep(random.random() * 0.002)
+    return item
+
+def wait_for_threads(count, timeout=5.0):
+    deadline = time.time() + timeout
+    while threading.active_count() > count and time.time() < deadline:
+        time.sleep(0.01)
+    return threading.active_count() <= count
+
+def check_order():
+    tracker = Tracker()
+    results = list(handler.run_pipeline(tracker.items(NUM_ITEMS), tracker.first_stage, jitter, lambda item: item * 2, jitter, on_drop=tracker.on_drop))
+    return results == [item * 2 for item in range(NUM_ITEMS)] and not tracker.dropped
+
+def check_middle_error():
+    tracker = Tracker()
+
+    def fail(item):
+        if item == 7:
+            raise RuntimeError("stage failed")
+        return jitter(item)
+
+    results = []
+    try:
+        for result in handler.run_pipeline(tracker.items(NUM_ITEMS), tracker.first_stage, fail, jitter, on_drop=tracker.on_drop):
+            results.append(result)
+    except RuntimeError as e:
+        error = str(e)
+    else:
+        error = None
+    # the pipeline stops at once, results before the failed item may be dropped but stay in order
+    return error == "stage failed" and results == list(range(min(len(results), 7))) and tracker.accounted()
+
+def check_early_stop():
+    tracker = Tracker()
+    pipeline = handler.run_pipeline(tracker.items(NUM_ITEMS), tracker.first_stage, jitter, jitter, on_drop=tracker.on_drop)
+    results = [next(pipeline) for _ in range(3)]
+    pipeline.close()
+    return results == [0, 1, 2] and len(tracker.taken) < NUM_ITEMS and tracker.accounted()
+
+def frame_files(directory, count):
+    from PIL import Image
+
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"frame_{index:04d}.png")
+        Image.fromarray(np.full((8, 16, 3), index, dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+def check_sequence_cleanup(stop):
+    """
+    Frames are "downloaded" lazily into a directory, which must be empty after the run
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        sources = frame_files(directory, NUM_ITEMS)
+
+        def downloads():
+            for source in sources:
+                path = source + ".download"
+                os.rename(source, path)
+                yield path
+
+        image_to_hdri = handler.image_to_hdri
+        if stop == "error":
+            def failing(image_array):
+                # the fifth frame fails in the middle stage
+                if image_array[0, 0, 0] == 4:
+                    raise RuntimeError("model failed")
+                return image_to_hdri(image_array)
+            handler.image_to_hdri = failing
+        try:
+            sequence = handler.process_hdri_sequence(downloads(), "16x8", "png")
+            names = []
+            try:
+                for name, _ in sequence:
+                    names.append(name)
+                    if stop == "close" and len(names) == 3:
+                        sequence.close()
+                        break
+            except RuntimeError:
+                pass
+        finally:
+            handler.image_to_hdri = image_to_hdri
+        leaked = [name for name in os.listdir(directory) if name.endswith(".download")]
+        if stop == "complete":
+            ok = len(names) == NUM_ITEMS and names == sorted(names)
+        else:
+            ok = len(names) < NUM_ITEMS
+        return ok and not leaked
+
+def main():
+    handler.logger.setLevel("WARNING")
+    random.seed(0)
+    threads = threading.active_count()
+    checks = [
+        ("results in order", check_order),
+        ("error in a middle stage", check_middle_error),
+        ("consumer stops early", check_early_stop),
+        ("sequence: all frames", lambda: check_sequence_cleanup("complete")),
+        ("sequence: no temp files left after an error", lambda: check_sequence_cleanup("error")),
+        ("sequence: no temp files left after close", lambda: check_sequence_cleanup("close")),
+    ]
+    failures = 0
+    for name, check in checks:
+        # repeated, the interleaving of the stage threads differs from run to run
+        ok = all(check() for _ in range(20))
+        ok &= wait_for_threads(threads)
+        failures += not ok
+        print(f"{'ok' if ok else 'FAIL':4s}  {name}")
+    print(f"{failures} failed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
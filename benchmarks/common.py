@@ -0,0 +1,28 @@
+import os
+import sys
+import types
+import importlib
+import importlib.util
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "diffusionlight"
+
+def import_node_module(name):
+    """
+    Import a module of the node pack without running its __init__.py (no ComfyUI needed)
+    """
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [REPO_ROOT]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+def import_node_pack():
+    """
+    Import the node pack the way ComfyUI does (runs __init__.py)
+    """
+    spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(REPO_ROOT, "__init__.py"), submodule_search_locations=[REPO_ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = package
+    spec.loader.exec_module(package)
+    return package
@@ -0,0 +1,92 @@
+import functools
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# the dark prompt is the conditioning of this EV, ConditioningAverage interpolates in between
+DARK_EV = -5.0
+
+def cached_encoder(encode, max_size=32):
+    """
+    Wrap a prompt encoder (str -> conditioning tensor [1, T, D]) in an LRU cache,
+    jobs with the same prompts skip the text encoder. cache_info() reports the hits.
+    The cached tensors are shared, callers must not modify them in place.
+    """
+    return functools.lru_cache(maxsize=max_size)(encode)
+
+def exposure_conditionings(encode, prompt, dark_prompt, ev_values, dark_ev=DARK_EV):
+    """
+    Positive conditioning of every exposure, same as the workflow's ConditioningAverage
+    Args:
+        encode (callable): prompt encoder, e.g. from cached_encoder.
+        prompt (str): prompt of EV 0.
+        dark_prompt (str): prompt of dark_ev.
+        ev_values (list): EV of every exposure, e.g. [0.0, -2.5, -5.0].
+    Returns:
+        list: conditioning [1, T, D] per exposure.
+    """
+    bright = encode(prompt)
+    dark = encode(dark_prompt)
+    return [torch.lerp(bright, dark, ev / dark_ev) for ev in ev_values]
+
+def sample_exposures(denoiser, latent, noise, sigmas, conditionings, uncond, cfg=5.0, shared_steps=0, shared_conditioning=None):
+    """
+    Euler sampling of one latent per exposure from the same starting latent and noise.
+
+    The first shared_steps steps are run once for all exposures with shared_conditioning,
+    then the latent branches and the remaining steps run with the conditioning of every
+    exposure, all exposures (and their unconditional halves) in a single batch per step.
+    shared_steps=0 gives the same result as sampling every exposure on its own.
+
+    Args:
+        denoiser (callable): (x [N, C, H, W], sigma [N], cond [N, T, D]) -> denoised x [N, C, H, W].
+        latent (torch.Tensor): starting (inpainting) latent [1, C, H, W].
+        noise (torch.Tensor): noise [1, C, H, W], added at sigmas[0].
+        sigmas (torch.Tensor): noise levels [steps + 1], decreasing to 0.
+        conditionings (list): positive conditioning [1, T, D] per exposure.
+        uncond (torch.Tensor): negative conditioning [1, T, D].
+        cfg (float): classifier-free guidance scale.
+        shared_steps (int): number of steps run once for all exposures.
+        shared_conditioning (torch.Tensor): conditioning of the shared steps, the mean of the exposures' by default.
+    Returns:
+        tuple: the latents [E, C, H, W], and a dict of denoiser evaluations (batch rows) made,
+        evaluations the per-exposure sampling would make, evaluations saved and denoiser calls.
+    """
+    num_exposures = len(conditionings)
+    num_steps = len(sigmas) - 1
+    shared_steps = min(shared_steps, num_steps) if num_exposures > 1 else 0
+    if shared_conditioning is None:
+        # the middle of the exposures, every exposure branches off at the same distance
+        shared_conditioning = torch.cat(conditionings).mean(dim=0, keepdim=True)
+    stats = {"evaluations": 0, "baseline_evaluations": 2 * num_exposures * num_steps, "calls": 0}
+
+    def guided(x, sigma, cond):
+        # conditional and unconditional halves in one batch
+        batch = x.shape[0]
+        x_in = torch.cat([x, x])
+        sigma_in = sigma.expand(2 * batch)
+        cond_in = torch.cat([cond, uncond.expand(batch, -1, -1)])
+        stats["evaluations"] += x_in.shape[0]
+        stats["calls"] += 1
+        positive, negative = denoiser(x_in, sigma_in, cond_in).chunk(2)
+        return negative + cfg * (positive - negative)
+
+    with torch.no_grad():
+        x = latent + noise * sigmas[0]
+        cond = shared_conditioning
+        for i in range(num_steps):
+            if i == shared_steps:
+                # branch into the exposures
+                x = x.expand(num_exposures, -1, -1, -1)
+                cond = torch.cat(conditionings)
+            denoised = guided(x, sigmas[i].reshape(1), cond)
+            # Euler step
+            x = x + (x - denoised) / sigmas[i] * (sigmas[i + 1] - sigmas[i])
+        if x.shape[0] != num_exposures:
+            x = x.repeat(num_exposures, 1, 1, 1)
+
+    stats["saved_evaluations"] = stats["baseline_evaluations"] - stats["evaluations"]
+    logger.info(f"Sampled {num_exposures} exposures with {shared_steps}/{num_steps} shared steps: {stats['evaluations']} denoiser evaluations, {stats['saved_evaluations']} saved")
+    return x, stats
@@ -1,20 +1,47 @@
+import io
 import os
+import re
+import uuid
+import queue
 import tempfile
-import requests
+import threading
 from urllib.parse import urlparse
-import runpod
-import torch
-from PIL import Image
-import numpy as np
-from diffusers import StableDiffusionPipeline
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
+# Model libraries (torch, diffusers) are imported in warm_up(), not here,
+# so the worker is ready to accept jobs before they finish loading
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_warm_up_future = None
+
+CONTENT_TYPES = {
+    "exr": "image/x-exr",
+    "hdr": "image/vnd.radiance",
+    "png": "image/png",
+}
+
+def warm_up():
+    """Import the model libraries ahead of the first job"""
+    logger.info("Warming up model libraries...")
+    import torch
+    from diffusers import StableDiffusionPipeline
+    logger.info("Warm-up completed")
+
+def start_warm_up():
+    """Start warm_up() in the background once, returns its future"""
+    global _warm_up_future
+    if _warm_up_future is None:
+        _warm_up_future = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm_up").submit(warm_up)
+    return _warm_up_future
+
 def download_image(url):
     """Download image from URL to temporary file"""
+    import requests
+
     try:
         response = requests.get(url, stream=True)
         response.raise_for_status()
@@ -34,67 +61,230 @@ def download_image(url):
         logger.error(f"Error downloading image: {str(e)}")
         raise
 
+def load_image(image_path, resolution="1024x512"):
+    """Decode an input image and resize it to the target resolution"""
+    from PIL import Image
+    import numpy as np
+
+    # Load the input image
+    input_image = Image.open(image_path).convert('RGB')
+    
+    # Parse resolution
+    width, height = map(int, resolution.split('x'))
+    
+    # Resize image to target resolution
+    input_image = input_image.resize((width, height), Image.Resampling.LANCZOS)
+    
+    # Convert to numpy array for processing
+    return np.array(input_image)
+
+def image_to_hdri(image_array):
+    """Convert an image array to a linear HDRI array"""
+    import numpy as np
+
+    # Simple HDRI conversion (placeholder - replace with actual DiffusionLight logic)
+    # This is where you'd integrate your actual DiffusionLight processing
+    return image_array.astype(np.float32) / 255.0
+
+def save_hdri(hdri_array, output_path, format="exr"):
+    """Encode an HDRI array to output_path (a path or a binary file object) based on format"""
+    import hdr_codec
+
+    if format.lower() == 'exr':
+        hdr_codec.write_exr(output_path, hdri_array, pixel_type="half")
+    elif format.lower() == 'hdr':
+        hdr_codec.write_rgbe(output_path, hdri_array)
+    else:
+        # Default to PNG
+        from PIL import Image
+        import numpy as np
+
+        hdri_image = Image.fromarray((hdri_array.clip(0, 1) * 255).astype(np.uint8))
+        hdri_image.save(output_path, format="PNG")
+    return output_path
+
+def encode_hdri(hdri_array, format="exr"):
+    """Encode an HDRI array in memory, returns the file content as a memoryview"""
+    buffer = io.BytesIO()
+    save_hdri(hdri_array, buffer, format)
+    return buffer.getbuffer()
+
 def process_hdri(image_path, resolution="1024x512", format="exr"):
-    """Process image to HDRI using DiffusionLight"""
+    """Process image to HDRI using DiffusionLight, returns the encoded file content"""
     try:
         logger.info(f"Processing HDRI with resolution {resolution} and format {format}")
         
-        # Load the input image
-        input_image = Image.open(image_path).convert('RGB')
-        
-        # Parse resolution
-        width, height = map(int, resolution.split('x'))
-        
-        # Resize image to target resolution
-        input_image = input_image.resize((width, height), Image.Resampling.LANCZOS)
-        
-        # Convert to numpy array for processing
-        image_array = np.array(input_image)
-        
-        # Simple HDRI conversion (placeholder - replace with actual DiffusionLight logic)
-        # This is where you'd integrate your actual DiffusionLight processing
-        hdri_array = image_array.astype(np.float32) / 255.0
-        
-        # Create output filename
-        output_filename = f"hdri_output.{format}"
-        output_path = os.path.join(tempfile.gettempdir(), output_filename)
-        
-        # Save based on format
-        if format.lower() == 'exr':
-            # For EXR format, you'd use OpenEXR library
-            # For now, save as PNG with HDR-like processing
-            hdri_image = Image.fromarray((hdri_array * 255).astype(np.uint8))
-            hdri_image.save(output_path.replace('.exr', '.png'))
-            output_path = output_path.replace('.exr', '.png')
-        elif format.lower() == 'hdr':
-            # For HDR format, you'd use specific HDR libraries
-            hdri_image = Image.fromarray((hdri_array * 255).astype(np.uint8))
-            hdri_image.save(output_path.replace('.hdr', '.png'))
-            output_path = output_path.replace('.hdr', '.png')
-        else:
-            # Default to PNG
-            hdri_image = Image.fromarray((hdri_array * 255).astype(np.uint8))
-            hdri_image.save(output_path)
-        
-        logger.info(f"HDRI processing completed: {output_path}")
-        return output_path
+        hdri_array = image_to_hdri(load_image(image_path, resolution))
+        
+        # Encode in memory, the upload streams it from there
+        data = encode_hdri(hdri_array, format)
+        
+        logger.info(f"HDRI processing completed: {data.nbytes / 2 ** 20:.1f} MiB")
+        return data
         
     except Exception as e:
         logger.error(f"Error processing HDRI: {str(e)}")
         raise
 
-def upload_to_storage(file_path):
-    """Upload processed file to temporary storage and return URL"""
+class _PipelineError:
+    def __init__(self, error):
+        self.error = error
+
+_PIPELINE_DONE = object()
+
+def run_pipeline(items, *stages, depth=2, on_drop=None):
+    """
+    Run items through stages (e.g. decode, process, encode), every stage in its own
+    thread with at most depth items waiting in between, so the stages overlap.
+    Yields the results of the last stage in order, re-raises the first stage error.
+    After an error or an early stop, on_drop is called with every input item that was
+    taken from items but never reached the first stage (e.g. to delete its temporary file).
+    """
+    cancelled = threading.Event()
+    queues = [queue.Queue(maxsize=depth) for _ in range(len(stages) + 1)]
+
+    def drop(item):
+        if on_drop is not None:
+            try:
+                on_drop(item)
+            except Exception as e:
+                logger.warning(f"Could not clean up a dropped pipeline item: {str(e)}")
+
+    def feed():
+        try:
+            for item in items:
+                if cancelled.is_set():
+                    drop(item)
+                    break
+                queues[0].put(item)
+        except Exception as e:
+            cancelled.set()
+            queues[0].put(_PipelineError(e))
+        queues[0].put(_PIPELINE_DONE)
+
+    def work(stage, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is not _PIPELINE_DONE and not isinstance(item, _PipelineError):
+                # after an error, drop the remaining items so nothing blocks
+                if cancelled.is_set():
+                    if inbox is queues[0]:
+                        drop(item)
+                    continue
+                try:
+                    item = stage(item)
+                except Exception as e:
+                    cancelled.set()
+                    item = _PipelineError(e)
+            outbox.put(item)
+            if item is _PIPELINE_DONE:
+                return
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=work, args=(stage, queues[i], queues[i + 1]), daemon=True) for i, stage in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+
+    item = None
     try:
-        # For now, we'll return the local file path
-        # In production, you'd upload to S3, Google Cloud Storage, etc.
-        logger.info(f"File ready for download: {file_path}")
-        return file_path
+        while True:
+            item = queues[-1].get()
+            if item is _PIPELINE_DONE:
+                return
+            if isinstance(item, _PipelineError):
+                raise item.error
+            yield item
+    finally:
+        # stop early (error or consumer gone) and let the stages run out
+        cancelled.set()
+        while item is not _PIPELINE_DONE:
+            item = queues[-1].get()
+
+def process_hdri_sequence(image_paths, resolution="1024x512", format="exr"):
+    """
+    Process frames (any iterable, e.g. a generator of downloaded paths) to an indexed
+    HDRI sequence hdri_0000.<format>, hdri_0001.<format>, ... with decode, process
+    and encode of consecutive frames overlapping. Yields (filename, encoded file content) in order.
+    """
+    logger.info(f"Processing HDRI sequence with resolution {resolution} and format {format}")
+
+    def remove_frame(frame):
+        # the downloaded input is not needed once decoded, or when the frame is dropped
+        try:
+            os.unlink(frame[1])
+        except OSError:
+            pass
+
+    def decode(frame):
+        index, image_path = frame
+        try:
+            image_array = load_image(image_path, resolution)
+        finally:
+            remove_frame(frame)
+        return index, image_array
+
+    def process(frame):
+        index, image_array = frame
+        return index, image_to_hdri(image_array)
+
+    def encode(frame):
+        index, hdri_array = frame
+        return f"hdri_{index:04d}.{format}", encode_hdri(hdri_array, format)
+
+    for output in run_pipeline(enumerate(image_paths), decode, process, encode, on_drop=remove_frame):
+        yield output
+
+def send_preview(event, image_path, preview_resolution="256x128", key="hdri_preview.png"):
+    """Stream a quick low resolution preview of the HDRI as an intermediate job update"""
+    import runpod
+
+    preview_array = image_to_hdri(load_image(image_path, preview_resolution))
+    runpod.serverless.progress_update(event, {
+        "stage": "preview",
+        "preview_url": upload_to_storage(encode_hdri(preview_array, "png"), key, "png"),
+        "resolution": preview_resolution
+    })
+
+def job_directory(job_id):
+    """Directory of a job's outputs in storage, a random one for jobs without an id"""
+    if not job_id:
+        return uuid.uuid4().hex
+    return re.sub(r"[^A-Za-z0-9._-]", "_", str(job_id))
+
+def upload_to_storage(data, key, format="exr"):
+    """
+    Upload an encoded file (bytes-like, e.g. from encode_hdri) to object storage under key and return its URL.
+    Without a bucket configured (DIFFUSIONLIGHT_S3_BUCKET) the file is written to a local temporary
+    directory and its path is returned.
+    """
+    from storage import get_storage
+
+    try:
+        storage = get_storage()
+        if storage is None:
+            file_path = os.path.join(tempfile.gettempdir(), "hdri_" + key)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "wb") as f:
+                f.write(data)
+            logger.info(f"File ready for download: {file_path}")
+            return file_path
+        
+        return storage.upload(data, key, CONTENT_TYPES.get(format, "application/octet-stream"))
         
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}")
         raise
 
+def submit_upload(data, key, format="exr"):
+    """Run upload_to_storage in the background, returns a future of the URL so the upload overlaps further processing"""
+    from storage import get_storage, completed
+
+    storage = get_storage()
+    if storage is None:
+        return completed(upload_to_storage(data, key, format))
+    # looked up when it runs, like every other step
+    return storage.submit(lambda: upload_to_storage(data, key, format))
+
 def handler(event):
     """Main handler function for RunPod"""
     try:
@@ -103,12 +293,23 @@ def handler(event):
         # Extract parameters from the event
         job_input = event.get('input', {})
         image_url = job_input.get('image_url')
+        frame_urls = job_input.get('frame_urls')
         resolution = job_input.get('resolution', '1024x512')
         format = job_input.get('format', 'exr')
         job_id = job_input.get('job_id')
+        preview = job_input.get('preview', False)
+        preview_resolution = job_input.get('preview_resolution', '256x128')
+        
+        if not image_url and not frame_urls:
+            raise ValueError("image_url or frame_urls is required")
         
-        if not image_url:
-            raise ValueError("image_url is required")
+        # Step 0: Make sure the model libraries are loaded
+        start_warm_up().result()
+        
+        if frame_urls:
+            return handle_sequence(frame_urls, resolution, format, job_id)
+        
+        output_dir = job_directory(job_id)
         
         logger.info(f"Processing job {job_id}: {image_url} -> {resolution} {format}")
         
@@ -116,13 +317,21 @@ def handler(event):
         logger.info("Downloading input image...")
         input_image_path = download_image(image_url)
         
+        # Step 1.5: Clients judge latency by the first preview, send it before the full render
+        if preview:
+            logger.info("Sending preview...")
+            try:
+                send_preview(event, input_image_path, preview_resolution, f"{output_dir}/hdri_preview.png")
+            except Exception as e:
+                logger.warning(f"Preview failed, continuing with the full render: {str(e)}")
+        
         # Step 2: Process the image to HDRI
         logger.info("Processing HDRI...")
-        output_path = process_hdri(input_image_path, resolution, format)
+        data = process_hdri(input_image_path, resolution, format)
         
         # Step 3: Upload to storage (or prepare for download)
-        logger.info("Preparing output...")
-        result_url = upload_to_storage(output_path)
+        logger.info("Uploading output...")
+        result_url = upload_to_storage(data, f"{output_dir}/hdri_output.{format}", format)
         
         # Clean up temporary input file
         try:
@@ -151,6 +360,34 @@ def handler(event):
             "error": str(e)
         }
 
+def handle_sequence(frame_urls, resolution, format, job_id):
+    """Sequence mode: frames are downloaded, processed and uploaded as a stream"""
+    logger.info(f"Processing sequence job {job_id}: {len(frame_urls)} frames -> {resolution} {format}")
+    
+    # the pipeline's feeder thread pulls from this generator, downloads overlap processing
+    frame_paths = (download_image(url) for url in frame_urls)
+    # every frame is uploaded in the background while the next ones are processed
+    output_dir = job_directory(job_id)
+    uploads = [submit_upload(data, f"{output_dir}/{filename}", format) for filename, data in process_hdri_sequence(frame_paths, resolution, format)]
+    result_urls = [upload.result() for upload in uploads]
+    
+    logger.info(f"Job {job_id} completed successfully")
+    return {
+        "status": "completed",
+        "output": {
+            "result_urls": result_urls,
+            "num_frames": len(result_urls),
+            "resolution": resolution,
+            "format": format,
+            "job_id": job_id
+        }
+    }
+
 if __name__ == "__main__":
+    import runpod
+
+    # Load the model libraries while the worker starts polling for jobs
+    start_warm_up()
+
     # Start the RunPod serverless handler
     runpod.serverless.start({"handler": handler})
@@ -0,0 +1,255 @@
+import io
+import os
+import zlib
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+# Radiance RGBE: runs shorter than this are cheaper to store as literals
+MIN_RUN_LENGTH = 4
+
+# OpenEXR compression: (id, scanlines per chunk)
+EXR_COMPRESSION = {
+    "none": (0, 1),
+    "zips": (2, 1),
+    "zip": (3, 16),
+}
+# zlib level of the zip modes, same default as the OpenEXR library
+EXR_ZIP_LEVEL = 4
+EXR_PIXEL_TYPE = {
+    "half": (1, np.dtype("<f2")),
+    "float": (2, np.dtype("<f4")),
+}
+
+def as_numpy(image):
+    """
+    Zero-copy view of an image [H, W, 3], CPU tensors share their host buffer
+    """
+    if isinstance(image, torch.Tensor):
+        return image.detach().cpu().numpy()
+    return np.asarray(image)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def map_threads(fn, items):
+    """
+    list(map(fn, items)) on torch's intra-op thread count, for functions that release the GIL (zlib, NumPy)
+    """
+    global _executor, _executor_pid
+    # all cores inline, a post-processing worker's share of them (see postprocess_pool._init_worker)
+    num_threads = torch.get_num_threads()
+    if num_threads < 2 or len(items) < 2:
+        return [fn(item) for item in items]
+    with _executor_lock:
+        # a forked post-processing worker inherits the executor but not its threads
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="hdr_codec")
+            _executor_pid = os.getpid()
+    # a few batches per thread, single scanline chunks are too small for a task each
+    batch = -(-len(items) // (num_threads * 4))
+    futures = [_executor.submit(lambda group: [fn(item) for item in group], items[i:i + batch]) for i in range(0, len(items), batch)]
+    return [result for future in futures for result in future.result()]
+
+def write_bytes(file, data):
+    """
+    Write data to a path or to a binary file object (e.g. io.BytesIO)
+    """
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "wb") as f:
+            f.write(data)
+    else:
+        file.write(data)
+
+# RADIANCE RGBE
+def encode_rgbe(image, rle=True):
+    """
+    Encode a HDR image to Radiance .hdr bytes
+    Args:
+        image (torch.Tensor | np.ndarray): linear HDR image of shape [H, W, 3].
+        rle (bool): use the per-scanline run-length encoding (only for 8 <= width < 32768).
+    Returns:
+        bytes: the .hdr file content.
+    """
+    rgbe = float_to_rgbe(as_numpy(image))
+    height, _, width = rgbe.shape
+    header = f"#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n-Y {height} +X {width}\n".encode("ascii")
+    if rle and 8 <= width < 0x8000:
+        return header + rle_scanlines(rgbe).tobytes()
+    return header + rgbe.transpose(0, 2, 1).tobytes()
+
+def write_rgbe(file, image, rle=True):
+    write_bytes(file, encode_rgbe(image, rle=rle))
+
+def float_to_rgbe(image):
+    """
+    Convert [H, W, 3] floats to shared-exponent RGBE bytes, stored per scanline
+    as planes of R, G, B and E (shape [H, 4, W]) the way the RLE wants them
+    """
+    height, width, _ = image.shape
+    image = np.asarray(image, dtype=np.float32)
+    brightest = np.maximum(image[..., 0], image[..., 1])
+    np.maximum(brightest, image[..., 2], out=brightest)
+    invalid = ~(brightest > 1e-32)
+    # brightest = m * 2 ** e with m in [0.5, 1), e = its float32 exponent bits - 126,
+    # the scale 2 ** (8 - e) is made from the exponent bits as well
+    exponent = brightest.view(np.int32) >> 23
+    scale = np.subtract(261, exponent)
+    scale <<= 23
+    scale = scale.view(np.float32)
+    scale[invalid] = 0
+    rgbe = np.empty((height, 4, width), dtype=np.uint8)
+    for channel in range(3):
+        # brightest * scale stays below 256, negatives and NaN become 0
+        scaled = np.multiply(image[..., channel], scale, out=brightest)
+        np.fmax(scaled, 0, out=scaled)
+        rgbe[:, channel] = scaled
+    exponent += 2
+    np.minimum(exponent, 255, out=exponent)
+    exponent[invalid] = 0
+    rgbe[:, 3] = exponent
+    return rgbe
+
+def rle_scanlines(rgbe):
+    """
+    New-style RLE of [H, 4, W] RGBE planes, vectorized over the whole image.
+    Every scanline is a 4 byte marker followed by its R, G, B and E bytes, each
+    component stored as run packets (128 + count, value) and literal packets (count, bytes).
+    """
+    height, _, width = rgbe.shape
+    flat = rgbe.reshape(-1)
+    n = flat.size
+
+    # same as the previous byte, every component of every scanline starts over
+    same = np.empty(n, dtype=bool)
+    np.equal(flat[1:], flat[:-1], out=same[1:])
+    same[::width] = False
+
+    # a byte is in a long run when a window of MIN_RUN_LENGTH equal bytes covers it
+    num_windows = n - MIN_RUN_LENGTH + 1
+    window = same[1:num_windows + 1].copy()
+    for k in range(2, MIN_RUN_LENGTH):
+        window &= same[k:num_windows + k]
+    in_run = np.zeros(n, dtype=bool)
+    for k in range(MIN_RUN_LENGTH):
+        in_run[k:num_windows + k] |= window
+
+    # segments are long runs and maximal stretches of short runs (literals)
+    # starting where in_run switches, where a new value starts a run, and at every component
+    starts = np.empty(n, dtype=bool)
+    starts[0] = True
+    np.not_equal(in_run[1:], in_run[:-1], out=starts[1:])
+    starts[::width] = True
+    np.logical_or(starts, in_run & ~same, out=starts)
+    segment_starts = np.flatnonzero(starts)
+    segment_lengths = np.diff(np.append(segment_starts, n))
+    segment_is_run = in_run[segment_starts]
+
+    # split segments into packets of at most 127 (run) or 128 (literal) bytes
+    limit = np.where(segment_is_run, 127, 128)
+    num_packets = (segment_lengths + limit - 1) // limit
+    segment = np.repeat(np.arange(segment_starts.size), num_packets)
+    index = np.arange(segment.size) - np.repeat(np.cumsum(num_packets) - num_packets, num_packets)
+    packet_start = segment_starts[segment] + index * limit[segment]
+    packet_length = np.minimum(limit[segment], segment_starts[segment] + segment_lengths[segment] - packet_start)
+    packet_is_run = segment_is_run[segment]
+
+    # every packet is a count followed by the run value or the literal bytes,
+    # the 4 byte marker of a scanline goes in front of its first packet
+    has_marker = packet_start % (4 * width) == 0
+    body_size = np.where(packet_is_run, 1, packet_length)
+    packet_end = np.cumsum(4 * has_marker + 1 + body_size)
+    count_pos = packet_end - body_size - 1
+    out = np.empty(packet_end[-1], dtype=np.uint8)
+    out[count_pos] = np.where(packet_is_run, 128 + packet_length, packet_length)
+    marker_pos = count_pos[has_marker] - 4
+    for i, value in enumerate((2, 2, width >> 8, width & 0xFF)):
+        out[marker_pos + i] = value
+    # run values and literal bytes fill the rest in order
+    is_body = np.ones(out.size, dtype=bool)
+    is_body[count_pos] = False
+    for i in range(4):
+        is_body[marker_pos + i] = False
+    keep = ~in_run
+    keep[packet_start[packet_is_run]] = True
+    out[is_body] = flat[keep]
+    return out
+
+# OPENEXR
+def encode_exr(image, pixel_type="half", compression="zip"):
+    """
+    Encode a HDR image to a single-part scanline OpenEXR file
+    Args:
+        image (torch.Tensor | np.ndarray): linear HDR image of shape [H, W, 3].
+        pixel_type (str): "half" (float16) or "float" (float32).
+        compression (str): "none", "zips" (zlib per scanline) or "zip" (zlib per 16 scanlines).
+    Returns:
+        bytes: the .exr file content.
+    """
+    image = as_numpy(image)
+    height, width, _ = image.shape
+    type_id, dtype = EXR_PIXEL_TYPE[pixel_type]
+    compression_id, lines_per_chunk = EXR_COMPRESSION[compression]
+
+    # scanlines store channels in alphabetical order (B, G, R), converted in a single pass
+    pixels = np.empty((height, 3, width), dtype=dtype)
+    for i, channel in enumerate((2, 1, 0)):
+        pixels[:, i] = image[..., channel]
+    pixels = pixels.view(np.uint8).reshape(height, -1)
+
+    header = exr_header(width, height, type_id, compression_id)
+    rows = [pixels[y:y + lines_per_chunk].reshape(-1) for y in range(0, height, lines_per_chunk)]
+    if compression_id != 0:
+        chunk_data = map_threads(compress_zip_chunk, rows)
+    else:
+        chunk_data = [data.tobytes() for data in rows]
+    num_chunks = len(rows)
+    offset = len(header) + 8 * num_chunks
+    offsets = []
+    chunks = []
+    for y, data in zip(range(0, height, lines_per_chunk), chunk_data):
+        chunk = struct.pack("<ii", y, len(data)) + data
+        offsets.append(offset)
+        offset += len(chunk)
+        chunks.append(chunk)
+    return b"".join([header, struct.pack(f"<{num_chunks}Q", *offsets)] + chunks)
+
+def write_exr(file, image, pixel_type="half", compression="zip"):
+    write_bytes(file, encode_exr(image, pixel_type=pixel_type, compression=compression))
+
+def compress_zip_chunk(data):
+    compressed = zlib.compress(zip_predictor(data), EXR_ZIP_LEVEL)
+    # OpenEXR keeps a chunk raw when compression does not help
+    return compressed if len(compressed) < data.size else data.tobytes()
+
+def zip_predictor(data):
+    """
+    OpenEXR ZIP pre-processing: split even and odd bytes, then delta encode
+    """
+    reordered = np.concatenate([data[0::2], data[1::2]])
+    predicted = reordered.copy()
+    predicted[1:] = reordered[1:] - reordered[:-1] + 128  # uint8 wraps around like the reference
+    return predicted.tobytes()
+
+def exr_header(width, height, type_id, compression_id):
+    def attribute(name, type_name, value):
+        return name.encode() + b"\0" + type_name.encode() + b"\0" + struct.pack("<i", len(value)) + value
+
+    channels = b"".join(name + b"\0" + struct.pack("<iB3xii", type_id, 0, 1, 1) for name in (b"B", b"G", b"R")) + b"\0"
+    window = struct.pack("<iiii", 0, 0, width - 1, height - 1)
+    header = io.BytesIO()
+    header.write(struct.pack("<ii", 20000630, 2))
+    header.write(attribute("channels", "chlist", channels))
+    header.write(attribute("compression", "compression", struct.pack("<B", compression_id)))
+    header.write(attribute("dataWindow", "box2i", window))
+    header.write(attribute("displayWindow", "box2i", window))
+    header.write(attribute("lineOrder", "lineOrder", struct.pack("<B", 0)))
+    header.write(attribute("pixelAspectRatio", "float", struct.pack("<f", 1.0)))
+    header.write(attribute("screenWindowCenter", "v2f", struct.pack("<ff", 0.0, 0.0)))
+    header.write(attribute("screenWindowWidth", "float", struct.pack("<f", 1.0)))
+    header.write(b"\0")
+    return header.getvalue()
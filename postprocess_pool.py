@@ -0,0 +1,163 @@
+import os
+import atexit
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import torch
+import torch.multiprocessing  # registers the shared-memory pickling of tensors
+
+logger = logging.getLogger(__name__)
+
+# number of worker processes, 0 (default) runs post-processing inline
+WORKERS_ENV = "DIFFUSIONLIGHT_POSTPROCESS_WORKERS"
+# "fork" (default where available), "forkserver" or "spawn", see PostprocessPool
+START_METHOD_ENV = "DIFFUSIONLIGHT_POSTPROCESS_START_METHOD"
+
+class PostprocessPool:
+    """
+    DiffusionLight worker-process pool for CPU post-processing
+    (ball2envmap, tonemapping of frame batches, HDR encoding)
+
+    Tensor inputs are copied into shared memory owned by the pool, the caller's tensors
+    (e.g. ComfyUI's cached node outputs) are left as they are. Only a handle to that
+    storage goes through the pipe and it is released once the job is done. Results
+    come back as regular tensors, nothing keeps a shared-memory file descriptor open.
+
+    fork is the default start method: workers inherit the node modules ComfyUI imported
+    by file path, which forkserver and spawn workers cannot import by name. The executor
+    only forks on its first submit, so start() is called right after construction and the
+    shared pool is created when this module is imported (the node package is loaded), before
+    ComfyUI runs a prompt or loads a model and before its server threads start. The ComfyUI
+    process may have initialised CUDA by then, the workers never touch it (run_postprocess
+    keeps CUDA tensors inline). A pool replacing a broken one is forked from a running node,
+    where a lock held by another thread can deadlock a worker.
+    Set DIFFUSIONLIGHT_POSTPROCESS_START_METHOD=forkserver when the node package is
+    importable by name to avoid forking the ComfyUI process altogether.
+    """
+    def __init__(self, num_workers, start_method=None, threads_per_worker=None):
+        if start_method is None:
+            start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        if threads_per_worker is None:
+            # the workers together use every core an inline call would use
+            threads_per_worker = max(torch.get_num_threads() // num_workers, 1)
+        self.num_workers = num_workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(threads_per_worker,),
+        )
+
+    def start(self):
+        """
+        Start every worker now and wait until they are up.
+        """
+        # one job per worker, the executor starts a worker per job until all are running
+        for future in [self.executor.submit(os.getpid) for _ in range(self.num_workers)]:
+            future.result()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in a worker process.
+        Returns:
+            concurrent.futures.Future: future of the function result.
+        """
+        args = [share_tensor(arg) for arg in args]
+        kwargs = {key: share_tensor(value) for key, value in kwargs.items()}
+        result = Future()
+
+        def done(future):
+            # the work item and its shared inputs are dropped with this future
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(unshare_tensor(future.result()))
+        self.executor.submit(fn, *args, **kwargs).add_done_callback(done)
+        return result
+
+    def map_batch(self, fn, images, *args, **kwargs):
+        """
+        Split a batch [B, H, W, 3] of independent frames into one chunk per worker
+        and concatenate the results.
+        """
+        # one shared copy for all chunks, the chunks are views of it
+        images = share_tensor(images)
+        chunks = images.tensor_split(min(self.num_workers, images.shape[0]))
+        futures = [self.submit(fn, chunk, *args, **kwargs) for chunk in chunks]
+        return torch.cat([future.result() for future in futures], dim=0)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+# HELPER FUNCTION
+def share_tensor(value):
+    """
+    Shared-memory copy of a CPU tensor (same strides), the input is not modified.
+    Tensors that are already shared and other values are returned as they are.
+    """
+    if isinstance(value, torch.Tensor) and value.device.type == "cpu" and not value.is_shared():
+        shared = torch.empty_like(value)
+        shared.share_memory_()
+        shared.copy_(value)
+        return shared
+    return value
+
+def unshare_tensor(value):
+    """
+    Regular copy of a tensor received from a worker, so its shared memory is freed with the job.
+    """
+    if isinstance(value, torch.Tensor) and value.is_shared():
+        return value.clone(memory_format=torch.preserve_format)
+    return value
+
+def _init_worker(threads_per_worker):
+    torch.set_num_threads(threads_per_worker)
+
+_pool = None
+
+def get_postprocess_pool():
+    """
+    Return the shared pool sized by DIFFUSIONLIGHT_POSTPROCESS_WORKERS, or None when disabled.
+    """
+    global _pool
+    if _pool is None:
+        num_workers = int(os.environ.get(WORKERS_ENV, "0"))
+        if num_workers > 0:
+            start_method = os.environ.get(START_METHOD_ENV) or None
+            logger.info(f"Starting post-processing pool with {num_workers} workers")
+            _pool = PostprocessPool(num_workers, start_method)
+            atexit.register(_pool.shutdown)
+            _pool.start()
+    return _pool
+
+def discard_postprocess_pool(pool):
+    """
+    Drop a pool that lost a worker (BrokenProcessPool), the next get_postprocess_pool() starts a new one.
+    """
+    global _pool
+    if _pool is pool:
+        logger.warning("A post-processing worker died, restarting the pool on the next call")
+        _pool = None
+    pool.shutdown(wait=False)
+
+def run_postprocess(fn, images, *args, **kwargs):
+    """
+    Run fn(images, *args, **kwargs) for a batch [B, H, W, 3] of independent frames.
+    With the pool enabled the frames are split across the workers, a single frame,
+    a single worker or CUDA tensors run inline with all threads, which is never slower.
+    A call that finds the pool broken runs inline as well.
+    """
+    pool = get_postprocess_pool()
+    if pool is None or pool.num_workers < 2 or images.shape[0] < 2 or images.device.type != "cpu":
+        return fn(images, *args, **kwargs)
+    try:
+        return pool.map_batch(fn, images, *args, **kwargs)
+    except BrokenProcessPool:
+        discard_postprocess_pool(pool)
+        return fn(images, *args, **kwargs)
+
+# fork the workers while the node package is imported, see PostprocessPool
+get_postprocess_pool()
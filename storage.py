@@ -0,0 +1,184 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# object storage is used when the bucket is set, outputs stay local files otherwise
+BUCKET_ENV = "DIFFUSIONLIGHT_S3_BUCKET"
+# S3-compatible endpoint (MinIO, R2, a local moto server, ...), AWS S3 when unset
+ENDPOINT_URL_ENV = "DIFFUSIONLIGHT_S3_ENDPOINT_URL"
+PREFIX_ENV = "DIFFUSIONLIGHT_S3_PREFIX"
+# parallel part uploads shared by all jobs
+UPLOAD_WORKERS_ENV = "DIFFUSIONLIGHT_UPLOAD_WORKERS"
+PART_SIZE_ENV = "DIFFUSIONLIGHT_UPLOAD_PART_SIZE_MB"
+URL_EXPIRES_ENV = "DIFFUSIONLIGHT_S3_URL_EXPIRES"
+
+# S3 multipart limits
+MIN_PART_SIZE = 5 * 2 ** 20
+MAX_PARTS = 10000
+
+class ObjectStorage:
+    """
+    DiffusionLight uploader for S3-compatible object storage
+
+    Objects are uploaded from memory, large ones in parallel multipart chunks.
+    A failed part is retried on its own, the rest of the object is not sent again.
+    The client and its connection pool are shared by every job of the worker.
+    """
+    def __init__(self, bucket, endpoint_url=None, prefix="", part_size=16 * 2 ** 20, max_workers=8, max_pending=4, max_retries=3, retry_delay=0.5, url_expires=7 * 24 * 3600, client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.url_expires = url_expires
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            config = Config(
+                max_pool_connections=max_workers + max_pending,
+                # retries are done here, per part
+                retries={"mode": "standard", "max_attempts": 1},
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+            )
+            client = boto3.session.Session().client("s3", endpoint_url=endpoint_url, config=config)
+        self.client = client
+        self.part_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload_part")
+        self.object_executor = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="upload")
+        # backpressure, a producer faster than the network waits instead of piling up outputs in memory
+        self.pending = threading.BoundedSemaphore(max_pending * 2)
+
+    def upload(self, data, key, content_type="application/octet-stream"):
+        """
+        Upload data under prefix + key.
+        Args:
+            data (bytes | bytearray | memoryview): the object content, e.g. io.BytesIO.getbuffer().
+            key (str): object key below the prefix.
+            content_type (str): Content-Type of the object.
+        Returns:
+            str: presigned URL to download the object.
+        """
+        key = self.prefix + key
+        data = memoryview(data).cast("B")
+        start = time.perf_counter()
+        if data.nbytes <= self.part_size:
+            self.retry(lambda: self.client.put_object(Bucket=self.bucket, Key=key, Body=bytes(data), ContentType=content_type), f"upload of {key}")
+            num_parts = 1
+        else:
+            num_parts = self.upload_multipart(data, key, content_type)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Uploaded {key}: {data.nbytes / 2 ** 20:.1f} MiB in {num_parts} parts, {elapsed:.2f} s ({data.nbytes / 2 ** 20 / max(elapsed, 1e-9):.1f} MiB/s)")
+        return self.client.generate_presigned_url("get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_expires)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run an upload (e.g. self.upload) in the background, blocks while too many uploads are pending.
+        Returns:
+            concurrent.futures.Future: future of the upload result.
+        """
+        self.pending.acquire()
+        try:
+            future = self.object_executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.pending.release()
+            raise
+        future.add_done_callback(lambda _: self.pending.release())
+        return future
+
+    def upload_multipart(self, data, key, content_type):
+        part_size = max(self.part_size, -(-data.nbytes // MAX_PARTS))
+        upload_id = self.retry(lambda: self.create_multipart_upload(key, content_type), f"upload of {key}")
+        futures = []
+        try:
+            for number, offset in enumerate(range(0, data.nbytes, part_size), start=1):
+                futures.append(self.part_executor.submit(self.upload_part, data, key, upload_id, number, offset, part_size))
+            parts = [future.result() for future in futures]
+            self.retry(lambda: self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}), f"upload of {key}")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            # do not leave the uploaded parts billed in the bucket
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except Exception as e:
+                logger.warning(f"Could not abort upload of {key}: {e}")
+            raise
+        return len(parts)
+
+    def create_multipart_upload(self, key, content_type):
+        try:
+            return self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)["UploadId"]
+        except Exception:
+            # a create whose response got lost still started an upload, abort it before trying again
+            self.abort_multipart_uploads(key)
+            raise
+
+    def abort_multipart_uploads(self, key):
+        """
+        Abort every pending multipart upload of key, keys are unique per job so none of them is in use
+        """
+        try:
+            response = self.client.list_multipart_uploads(Bucket=self.bucket, Prefix=key)
+            for upload in response.get("Uploads", []):
+                if upload["Key"] == key:
+                    self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload["UploadId"])
+        except Exception as e:
+            logger.warning(f"Could not abort pending uploads of {key}: {e}")
+
+    def upload_part(self, data, key, upload_id, number, offset, part_size):
+        # only this part is in flight as a copy, the output stays in memory once
+        body = bytes(data[offset:offset + part_size])
+        response = self.retry(lambda: self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body), f"part {number} of {key}")
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def retry(self, fn, name):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f"{name} failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.1f} s")
+                time.sleep(delay)
+
+    def shutdown(self, wait=True):
+        self.object_executor.shutdown(wait=wait)
+        self.part_executor.shutdown(wait=wait)
+
+
+# HELPER FUNCTION
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """
+    Return the shared ObjectStorage configured by DIFFUSIONLIGHT_S3_*, or None when no bucket is set.
+    """
+    global _storage
+    with _storage_lock:
+        if _storage is None and os.environ.get(BUCKET_ENV):
+            _storage = ObjectStorage(
+                os.environ[BUCKET_ENV],
+                endpoint_url=os.environ.get(ENDPOINT_URL_ENV) or None,
+                prefix=os.environ.get(PREFIX_ENV, ""),
+                part_size=int(float(os.environ.get(PART_SIZE_ENV, "16")) * 2 ** 20),
+                max_workers=int(os.environ.get(UPLOAD_WORKERS_ENV, "8")),
+                url_expires=int(os.environ.get(URL_EXPIRES_ENV, str(7 * 24 * 3600))),
+            )
+            logger.info(f"Uploading outputs to bucket {_storage.bucket}")
+            atexit.register(_storage.shutdown)
+    return _storage
+
+def completed(value):
+    """
+    Future that is already done, for code paths that do not upload in the background
+    """
+    future = Future()
+    future.set_result(value)
+    return future